@@ -14,6 +14,8 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 import clickhouse_connect
 
+from ..model.erd_analyzer import ERDAnalyzer
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -128,6 +130,8 @@ async def drop_tables(request: SchemaOperationRequest):
                 tables_affected[schema] = dropped_tables
                 total_tables += len(dropped_tables)
         
+        ERDAnalyzer.invalidate_cache()
+        
         return SchemaOperationResponse(
             status="success",
             message=f"Successfully dropped {total_tables} tables across {len(schemas_processed)} schemas",
@@ -162,6 +166,8 @@ async def truncate_tables(request: SchemaOperationRequest):
                 tables_affected[schema] = truncated_tables
                 total_tables += len(truncated_tables)
         
+        ERDAnalyzer.invalidate_cache()
+        
         return SchemaOperationResponse(
             status="success",
             message=f"Successfully truncated {total_tables} tables across {len(schemas_processed)} schemas",
@@ -245,6 +251,8 @@ async def cleanup_all():
             tables_affected['metadata'] = metadata_tables
             total_tables += len(metadata_tables)
         
+        ERDAnalyzer.invalidate_cache()
+        
         return SchemaOperationResponse(
             status="success",
             message=f"Complete cleanup finished: {total_tables} tables processed across {len(schemas_processed)} schemas",
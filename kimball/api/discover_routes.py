@@ -17,6 +17,7 @@ from pydantic import BaseModel
 import json
 import re
 import logging
+import time
 from collections import defaultdict
 
 from ..core.database import DatabaseManager
@@ -905,7 +906,7 @@ async def edit_discover_metadata(request: MetadataEditRequest):
             )
         
         # Generate new version for upsert functionality (ClickHouse ReplacingMergeTree)
-        new_version = int(datetime.now().timestamp() * 1000000)
+        new_version = time.time_ns() // 1000
         
         # Build update fields tracking for response
         update_fields = []
@@ -15,6 +15,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Dict, List, Any, Optional
 import logging
+import time
 from datetime import datetime
 
 from ..model.erd_analyzer import ERDAnalyzer
@@ -757,8 +758,7 @@ async def generate_stage3_transformations():
     Generate stage3 transformation SQL for gold schema tables.
     
     Creates transformations in metadata.transformation3 for each recommendation:
-    - DROP TABLE IF EXISTS gold.final_name
-    - CREATE TABLE gold.final_name with proper schema
+    - CREATE OR REPLACE TABLE gold.final_name (schema inferred from silver)
     - INSERT INTO gold.final_name SELECT ... FROM silver.source_table
     - OPTIMIZE TABLE gold.final_name FINAL
     
@@ -1064,7 +1064,7 @@ async def edit_erd_relationship(request: ERDRelationshipEditRequest):
         
         existing_record = existing[0]
         current_version = existing_record["version"]
-        new_version = int(datetime.now().timestamp() * 1000000)
+        new_version = time.time_ns() // 1000
         
         # Build update fields
         update_fields = []
@@ -1144,7 +1144,7 @@ async def edit_hierarchy(request: HierarchyEditRequest):
         
         existing_record = existing[0]
         current_version = existing_record["version"]
-        new_version = int(datetime.now().timestamp() * 1000000)
+        new_version = time.time_ns() // 1000
         
         # Build update fields
         update_fields = []
@@ -1245,7 +1245,7 @@ async def create_hierarchy(request: HierarchyCreateRequest):
             })
         
         # Generate version number
-        new_version = int(datetime.now().timestamp() * 1000000)
+        new_version = time.time_ns() // 1000
         
         # Insert new hierarchy
         insert_sql = f"""
@@ -1315,7 +1315,7 @@ async def create_erd_relationship(request: ERDRelationshipCreateRequest):
             raise HTTPException(status_code=404, detail=f"One or both Stage 2 tables not found: {request.table1}_stage2, {request.table2}_stage2")
         
         # Generate version number
-        new_version = int(datetime.now().timestamp() * 1000000)
+        new_version = time.time_ns() // 1000
         
         # Create relationship object
         relationship = {
@@ -1442,7 +1442,7 @@ async def delete_erd_relationships(table_name: str, relationship_id: Optional[st
             deleted_count = len(current_relationships)
         
         # Generate new version
-        new_version = int(datetime.now().timestamp() * 1000000)
+        new_version = time.time_ns() // 1000
         
         # Insert updated record
         insert_sql = f"""
@@ -1513,7 +1513,7 @@ async def delete_hierarchy(table_name: str, hierarchy_name: Optional[str] = None
             raise HTTPException(status_code=404, detail=f"Hierarchy '{hierarchy_name}' not found for table '{table_name}'")
         
         # Generate new version
-        new_version = int(datetime.now().timestamp() * 1000000)
+        new_version = time.time_ns() // 1000
         
         # Insert "deleted" record (soft delete by setting empty values)
         insert_sql = f"""
@@ -1590,6 +1590,9 @@ async def generate_calendar_dimension(request: CalendarGenerationRequest):
             request.end_date
         )
         
+        # silver.calendar_stage1 was dropped and recreated
+        ERDAnalyzer.invalidate_cache()
+        
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result["message"])
         
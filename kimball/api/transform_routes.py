@@ -13,7 +13,7 @@ The Transform phase focuses on:
 """
 
 import logging
-from datetime import datetime
+import time
 from typing import Dict, Any, List, Optional
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
@@ -22,6 +22,7 @@ from ..core.database import DatabaseManager
 from ..core.sql_transformation import SQLTransformation, TransformationStage
 from ..core.sql_parser import SQLParser
 from ..core.transformation_storage import TransformationStorage
+from ..model.erd_analyzer import ERDAnalyzer
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -433,7 +434,7 @@ async def create_transformation(request: TransformationRequest):
         created_statements = []
         for statement in request.statements:
             # Generate new version for upsert
-            new_version = int(datetime.now().timestamp() * 1000000)
+            new_version = time.time_ns() // 1000
             
             # Escape SQL statement
             escaped_sql = statement.sql_statement.replace("'", "''")
@@ -552,7 +553,7 @@ async def update_transformation(transformation_name: str, request: Transformatio
         upserted_statements = []
         for statement in request.statements:
             # Generate new version for upsert
-            new_version = int(datetime.now().timestamp() * 1000000)
+            new_version = time.time_ns() // 1000
             
             # Escape SQL statement
             escaped_sql = statement.sql_statement.replace("'", "''")
@@ -659,7 +660,7 @@ async def create_statement(request: StatementRequest):
             )
         
         # Generate new version for upsert
-        new_version = int(datetime.now().timestamp() * 1000000)
+        new_version = time.time_ns() // 1000
         
         # Escape SQL statement
         escaped_sql = request.sql_statement.replace("'", "''")
@@ -904,6 +905,9 @@ async def execute_transformation(transformation_id: str, stage: Optional[str] =
         engine = TransformEngine()
         result = engine.execute_transformation(transformation_id, stage)
         
+        # Executed statements may have dropped and rebuilt silver tables
+        ERDAnalyzer.invalidate_cache()
+        
         return result
         
     except Exception as e:
@@ -938,6 +942,9 @@ async def execute_transformations_parallel(request: dict):
         engine = TransformEngine()
         result = engine.execute_transformations_parallel(transformation_names, stage)
         
+        # Executed statements may have dropped and rebuilt silver tables
+        ERDAnalyzer.invalidate_cache()
+        
         return result
         
     except Exception as e:
@@ -979,6 +986,9 @@ async def execute_all_transformations_for_stage(
         engine = TransformEngine()
         result = engine.execute_all_transformations_for_stage(stage, parallel)
         
+        # Executed statements may have dropped and rebuilt silver tables
+        ERDAnalyzer.invalidate_cache()
+        
         return result
         
     except HTTPException:
@@ -1158,6 +1168,7 @@ async def generate_stage1_from_discovery():
         next_transformation_id = (max_id_result[0]['max_id'] if max_id_result else 0) + 1
         
         created_transformations = []
+        pending = []  # every statement row, stored with one insert after the loop
         
         # Process each table
         for original_table, table_data in tables_metadata.items():
@@ -1200,12 +1211,7 @@ async def generate_stage1_from_discovery():
                 )
                 
                 # Create transformation object
-                transformation = SQLTransformation(transformation_data)
-                
-                # Store using the new framework
-                success = storage.store_transformation(transformation)
-                if not success:
-                    logger.error(f"Failed to store transformation {next_transformation_id}")
+                pending.append(SQLTransformation(transformation_data))
             
             created_transformations.append({
                 'transformation_id': next_transformation_id,
@@ -1217,6 +1223,10 @@ async def generate_stage1_from_discovery():
             
             next_transformation_id += 1
         
+        # Store all transformation statements using the new framework
+        if pending and not storage.store_transformations_bulk(pending):
+            logger.error(f"Failed to store {len(pending)} stage1 transformation statements")
+        
         return {
             "status": "success",
             "message": f"Generated {len(created_transformations)} stage1 transformations using new framework",
@@ -7,7 +7,9 @@ Supports multiple database types with a unified interface.
 
 import json
 import sys
-from typing import Dict, List, Any, Optional, Union, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Union, Tuple, Iterator
 from abc import ABC, abstractmethod
 
 from .config import Config
@@ -45,6 +47,35 @@ class DatabaseManager:
         else:
             self.logger = logger
         self.connections = {}
+        # ClickHouse HTTP clients use a session, which rejects concurrent queries,
+        # so threads other than the creating one get their own thread-local client
+        self._owner_thread_id = threading.get_ident()
+    
+    # Worker threads shared by every DatabaseManager for concurrent reads. Their
+    # ClickHouse clients are kept per thread (keyed by connection settings), so
+    # they outlive a single call and a single DatabaseManager instance.
+    _worker_executor = None
+    _worker_executor_lock = threading.Lock()
+    _worker_local = threading.local()
+    
+    def get_worker_executor(self) -> ThreadPoolExecutor:
+        """
+        Get the process-wide executor for running independent queries concurrently.
+        
+        The executor is long-lived; submit work to it rather than using it as a
+        context manager. Tasks must not wait on other tasks of the same executor.
+        
+        Returns:
+            ThreadPoolExecutor: Shared executor sized by clickhouse.worker_threads (default 8)
+        """
+        with DatabaseManager._worker_executor_lock:
+            if DatabaseManager._worker_executor is None:
+                clickhouse_config = self.config.get_config().get("clickhouse", {})
+                DatabaseManager._worker_executor = ThreadPoolExecutor(
+                    max_workers=max(1, int(clickhouse_config.get("worker_threads", 8))),
+                    thread_name_prefix="kimball-db"
+                )
+            return DatabaseManager._worker_executor
     
     def _log(self, level: str, message: str):
         """Helper method to log or print based on logger availability."""
@@ -65,19 +96,19 @@ class DatabaseManager:
         """
         try:
             if connection_type == "clickhouse":
+                if threading.get_ident() != self._owner_thread_id:
+                    # Worker thread: use (or create) this thread's own client
+                    clients = getattr(DatabaseManager._worker_local, "clickhouse", None)
+                    if clients is None:
+                        clients = DatabaseManager._worker_local.clickhouse = {}
+                    client_key = self._clickhouse_client_key()
+                    conn = clients.get(client_key)
+                    if conn is None:
+                        conn = clients[client_key] = self._create_clickhouse_client()
+                    return conn
+                
                 if "clickhouse" not in self.connections:
-                    # Get ClickHouse configuration
-                    config = self.config.get_config()
-                    clickhouse_config = config.get("clickhouse", {})
-                    
-                    # Create ClickHouse connection
-                    self.connections["clickhouse"] = clickhouse_connect.get_client(
-                        host=clickhouse_config.get("host", "localhost"),
-                        port=clickhouse_config.get("port", 8123),
-                        username=clickhouse_config.get("username", "default"),
-                        password=clickhouse_config.get("password", ""),
-                        database=clickhouse_config.get("database", "default")
-                    )
+                    self.connections["clickhouse"] = self._create_clickhouse_client()
                 return self.connections["clickhouse"]
             else:
                 raise ValueError(f"Unsupported connection type: {connection_type}")
@@ -86,6 +117,26 @@ class DatabaseManager:
             self._log('error', f"Error getting connection: {str(e)}")
             raise
     
+    def _clickhouse_client_key(self) -> tuple:
+        """Identify the ClickHouse connection settings a client was created with."""
+        clickhouse_config = self.config.get_config().get("clickhouse", {})
+        return tuple(clickhouse_config.get(key) for key in ("host", "port", "username", "password", "database"))
+    
+    def _create_clickhouse_client(self) -> Any:
+        """Create a new ClickHouse client from the configuration."""
+        # Get ClickHouse configuration
+        config = self.config.get_config()
+        clickhouse_config = config.get("clickhouse", {})
+        
+        # Create ClickHouse connection
+        return clickhouse_connect.get_client(
+            host=clickhouse_config.get("host", "localhost"),
+            port=clickhouse_config.get("port", 8123),
+            username=clickhouse_config.get("username", "default"),
+            password=clickhouse_config.get("password", ""),
+            database=clickhouse_config.get("database", "default")
+        )
+    
     def test_connection(self, connection_type: str = "clickhouse") -> bool:
         """
         Test a database connection.
@@ -145,7 +196,8 @@ class DatabaseManager:
             self._log('error', f"Query execution error: {str(e)}")
             return None
     
-    def execute_query_dict(self, query: str, connection_type: str = "clickhouse") -> Optional[List[Dict[str, Any]]]:
+    def execute_query_dict(self, query: str, connection_type: str = "clickhouse",
+                           parameters: Optional[Dict[str, Any]] = None) -> Optional[List[Dict[str, Any]]]:
         """
         Execute a SQL query and return results as dictionaries.
         
@@ -155,6 +207,8 @@ class DatabaseManager:
         Args:
             query (str): SQL query to execute
             connection_type (str): Type of connection to use
+            parameters (Optional[Dict[str, Any]]): Values for server-side query
+                parameters (e.g. {tables:Array(String)}) referenced in the query
             
         Returns:
             Optional[List[Dict[str, Any]]]: Query results as dictionaries
@@ -163,7 +217,7 @@ class DatabaseManager:
             conn = self.get_connection(connection_type)
             if connection_type == "clickhouse":
                 # Execute ClickHouse query
-                result = conn.query(query)
+                result = conn.query(query, parameters=parameters)
                 
                 # Convert result to list of dictionaries (for Discover phase compatibility)
                 if result.result_rows and result.column_names:
@@ -188,6 +242,37 @@ class DatabaseManager:
             self._log('error', f"Query execution error (dict): {str(e)}")
             return None
     
+    def execute_query_iter(self, query: str, connection_type: str = "clickhouse",
+                           parameters: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Execute a SQL query and stream results as dictionaries, one row at a time.
+        
+        Unlike execute_query_dict, rows are not materialized up front and errors
+        are raised to the caller (after logging), since a partially consumed
+        stream cannot be represented by a None result.
+        
+        Args:
+            query (str): SQL query to execute
+            connection_type (str): Type of connection to use
+            parameters (Optional[Dict[str, Any]]): Values for server-side query parameters
+            
+        Yields:
+            Dict[str, Any]: One result row keyed by column name
+        """
+        if connection_type != "clickhouse":
+            raise ValueError(f"Unsupported connection type for query: {connection_type}")
+        
+        try:
+            conn = self.get_connection(connection_type)
+            with conn.query_row_block_stream(query, parameters=parameters) as stream:
+                column_names = stream.source.column_names
+                for block in stream:
+                    for row in block:
+                        yield dict(zip(column_names, row))
+        except Exception as e:
+            self._log('error', f"Query execution error (stream): {str(e)}")
+            raise
+    
     def get_tables(self, schema: str = "bronze", connection_type: str = "clickhouse") -> Optional[List[str]]:
         """
         Get list of tables in a schema.
@@ -326,13 +411,16 @@ class DatabaseManager:
             self._log('error', f"Error dropping table: {str(e)}")
             return False
     
-    def execute_command(self, command: str, connection_type: str = "clickhouse") -> bool:
+    def execute_command(self, command: str, connection_type: str = "clickhouse",
+                        parameters: Optional[Dict[str, Any]] = None) -> bool:
         """
         Execute a DDL command (CREATE, DROP, TRUNCATE, etc.) that doesn't return results.
         
         Args:
             command (str): DDL command to execute
             connection_type (str): Type of connection to use
+            parameters (Optional[Dict[str, Any]]): Values for server-side query parameters
+                (e.g. {schema_name:String}) referenced in the command
             
         Returns:
             bool: True if command executed successfully
@@ -341,7 +429,7 @@ class DatabaseManager:
             conn = self.get_connection(connection_type)
             if connection_type == "clickhouse":
                 # Execute ClickHouse command (for DDL operations)
-                conn.command(command)
+                conn.command(command, parameters=parameters)
                 self._log('info', f"Command executed successfully: {command[:100]}...")
                 return True
             else:
@@ -352,6 +440,40 @@ class DatabaseManager:
             self._log('error', f"Command execution error: {str(e)}")
             return False
 
+    def insert_rows(self, table: str, rows: List[Union[List[Any], Tuple]], column_names: List[str],
+                    connection_type: str = "clickhouse") -> bool:
+        """
+        Insert many rows in a single batch using the client's native insert.
+        
+        Values are sent as typed data (lists for Array columns, datetime for
+        DateTime columns), so no SQL literals need to be built or escaped.
+        
+        Args:
+            table (str): Fully qualified target table (e.g. metadata.erd)
+            rows (List[Union[List[Any], Tuple]]): Row values in column_names order
+            column_names (List[str]): Columns being inserted; others take their defaults
+            connection_type (str): Type of connection to use
+            
+        Returns:
+            bool: True if the rows were inserted successfully
+        """
+        if not rows:
+            return True
+        
+        try:
+            conn = self.get_connection(connection_type)
+            if connection_type == "clickhouse":
+                conn.insert(table, rows, column_names=list(column_names))
+                self._log('info', f"Inserted {len(rows)} rows into {table}")
+                return True
+            else:
+                self._log('error', f"Unsupported connection type for insert: {connection_type}")
+                return False
+                
+        except Exception as e:
+            self._log('error', f"Insert error for {table}: {str(e)}")
+            return False
+
     def close_all_connections(self):
         """Close all database connections."""
         try:
@@ -362,5 +484,11 @@ class DatabaseManager:
             
             self.connections.clear()
             
+            # Also close the calling thread's own client, if it has one
+            thread_clients = getattr(DatabaseManager._worker_local, "clickhouse", None) or {}
+            thread_conn = thread_clients.pop(self._clickhouse_client_key(), None)
+            if thread_conn is not None and hasattr(thread_conn, 'close'):
+                thread_conn.close()
+            
         except Exception as e:
             self._log('error', f"Error closing connections: {str(e)}")
@@ -24,7 +24,7 @@ class SQLParser:
         target_tables.extend(insert_matches)
         
         # CREATE TABLE pattern
-        create_pattern = r'CREATE\s+TABLE\s+([a-zA-Z_][a-zA-Z0-9_]*\.[a-zA-Z_][a-zA-Z0-9_]*)'
+        create_pattern = r'CREATE\s+(?:OR\s+REPLACE\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?([a-zA-Z_][a-zA-Z0-9_]*\.[a-zA-Z_][a-zA-Z0-9_]*)'
         create_matches = re.findall(create_pattern, sql, re.IGNORECASE)
         target_tables.extend(create_matches)
         
@@ -1,4 +1,5 @@
 import json
+from operator import itemgetter
 from typing import List, Optional
 from .sql_transformation import SQLTransformation, TransformationStage
 from .database import DatabaseManager
@@ -88,6 +89,53 @@ class TransformationStorage:
             print(f"Error storing transformation: {e}")
             return False
     
+    # Columns written by store_transformations_bulk; created_at/updated_at use their defaults
+    BULK_INSERT_COLUMNS = (
+        'transformation_stage',
+        'transformation_id',
+        'transformation_name',
+        'transformation_schema_name',
+        'dependencies',
+        'execution_frequency',
+        'execution_sequence',
+        'statement_type',
+        'sql_data',
+        'version'
+    )
+    
+    def store_transformations_bulk(self, transformations: List[SQLTransformation]) -> bool:
+        """Store many transformations with one native insert per transformation table"""
+        try:
+            rows_by_table = {}
+            for transformation in transformations:
+                table_name = self.get_transformation_table(transformation.get_stage())
+                rows_by_table.setdefault(table_name, []).append([
+                    transformation.get_stage().value,
+                    transformation.data.transformation_id,
+                    transformation.data.transformation_name,
+                    transformation.get_metadata('transformation_schema_name', 'metadata'),
+                    list(transformation.get_metadata('dependencies', []) or []),
+                    transformation.get_metadata('execution_frequency', 'daily'),
+                    transformation.data.execution_sequence,
+                    transformation.data.statement_type,
+                    json.dumps(transformation.to_json()),
+                    1
+                ])
+            
+            success = True
+            for table_name, rows in rows_by_table.items():
+                # Match the tables' ORDER BY (transformation_id, execution_sequence)
+                # so the server does not have to sort the block when writing the part
+                rows.sort(key=itemgetter(1, 6))
+                if not self.db_manager.insert_rows(table_name, rows, column_names=self.BULK_INSERT_COLUMNS):
+                    print(f"Error storing {len(rows)} transformations in {table_name}")
+                    success = False
+            return success
+            
+        except Exception as e:
+            print(f"Error storing transformations: {e}")
+            return False
+    
     def get_transformation(self, transformation_id: int, stage: TransformationStage) -> Optional[SQLTransformation]:
         """Retrieve a transformation by ID and stage"""
         try:
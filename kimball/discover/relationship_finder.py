@@ -7,10 +7,15 @@ for the Discover phase.
 
 from typing import Dict, List, Any, Optional, Tuple
 from collections import defaultdict
+from functools import lru_cache
 import json
 
 from ..core.logger import Logger
 
+_NUMERIC_TYPES = frozenset((
+    'int8', 'int16', 'int32', 'int64', 'uint8', 'uint16', 'uint32', 'uint64', 'float32', 'float64'
+))
+
 class RelationshipFinder:
     """
     Relationship finder for discovering table relationships and join candidates.
@@ -125,6 +130,7 @@ class RelationshipFinder:
                         "table": table_name,
                         "column": column.get("name", "unknown"),
                         "type": column.get("type", "unknown"),
+                        "type_norm": self._normalize_type(column.get("type", "unknown")),
                         "cardinality": column.get("cardinality", 0),
                         "is_pk_candidate": column.get("is_primary_key_candidate", False),
                         "classification": column.get("classification", "unknown")
@@ -136,8 +142,8 @@ class RelationshipFinder:
                 # Check for compatible joins
                 for i, occ1 in enumerate(occurrences):
                     for j, occ2 in enumerate(occurrences[i+1:], i+1):
-                        if self._are_types_compatible(occ1["type"], occ2["type"]):
-                            confidence = self._calculate_join_confidence(occ1, occ2)
+                        if self._are_normalized_types_compatible(occ1["type_norm"], occ2["type_norm"]):
+                            confidence = self._calculate_join_confidence(occ1, occ2, types_compatible=True)
                             
                             join_candidates.append({
                                 "table1": occ1["table"],
@@ -215,17 +221,40 @@ class RelationshipFinder:
         Returns:
             bool: True if types are compatible
         """
-        # Normalize types for comparison
-        type1_norm = type1.lower().replace('nullable(', '').replace(')', '')
-        type2_norm = type2.lower().replace('nullable(', '').replace(')', '')
+        return self._are_normalized_types_compatible(self._normalize_type(type1), self._normalize_type(type2))
+    
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _normalize_type(data_type: str) -> str:
+        """
+        Normalize a column type for compatibility checks (lower-cased, Nullable wrapper removed).
         
+        Args:
+            data_type (str): Column type
+            
+        Returns:
+            str: Normalized type
+        """
+        return data_type.lower().replace('nullable(', '').replace(')', '')
+    
+    @staticmethod
+    def _are_normalized_types_compatible(type1_norm: str, type2_norm: str) -> bool:
+        """
+        Check if two already-normalized column types are compatible for joining.
+        
+        Args:
+            type1_norm (str): First normalized column type
+            type2_norm (str): Second normalized column type
+            
+        Returns:
+            bool: True if types are compatible
+        """
         # Exact match
         if type1_norm == type2_norm:
             return True
         
         # Numeric type compatibility
-        numeric_types = ['int8', 'int16', 'int32', 'int64', 'uint8', 'uint16', 'uint32', 'uint64', 'float32', 'float64']
-        if type1_norm in numeric_types and type2_norm in numeric_types:
+        if type1_norm in _NUMERIC_TYPES and type2_norm in _NUMERIC_TYPES:
             return True
         
         # String type compatibility
@@ -234,13 +263,16 @@ class RelationshipFinder:
         
         return False
     
-    def _calculate_join_confidence(self, col1: Dict[str, Any], col2: Dict[str, Any]) -> float:
+    def _calculate_join_confidence(self, col1: Dict[str, Any], col2: Dict[str, Any],
+                                   types_compatible: bool) -> float:
         """
         Calculate confidence score for a potential join.
         
         Args:
             col1 (Dict[str, Any]): First column info
             col2 (Dict[str, Any]): Second column info
+            types_compatible (bool): Result of _are_types_compatible for the two columns,
+                already computed by the caller
             
         Returns:
             float: Join confidence score (0-1)
@@ -251,7 +283,7 @@ class RelationshipFinder:
         confidence += 0.3
         
         # Type compatibility bonus
-        if self._are_types_compatible(col1["type"], col2["type"]):
+        if types_compatible:
             confidence += 0.2
         
         # Primary key candidate bonus
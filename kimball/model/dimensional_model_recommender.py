@@ -11,10 +11,18 @@ Recommends fact tables (_fact suffix) and dimension tables (_dim suffix) for the
 """
 
 from typing import Dict, List, Any, Optional, Set
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from concurrent.futures import as_completed
+from functools import lru_cache
+from itertools import chain
+from operator import itemgetter
+import json
 import logging
+import re
+import zlib
 from datetime import datetime
 
+from ..core.config import Config
 from ..core.database import DatabaseManager
 from ..core.sql_transformation import SQLTransformation, TransformationStage
 from ..core.sql_parser import SQLParser
@@ -23,6 +31,136 @@ from .erd_analyzer import ERDAnalyzer
 
 logger = logging.getLogger(__name__)
 
+# Name/type patterns used by _is_fact_column to classify silver columns
+_DIM_TABLE_PATS = ('calendar', 'time', 'date', 'dim')
+_ID_PATS = ('_id', '_key', 'id_', 'key_')
+_DIM_NUM_PATS = ('_num', '_code', '_flag', 'is_', 'has_', 'working', '_year', '_day', '_month', '_qtr', '_week')
+_FACT_PATS = ('amount', 'total', 'sum', 'quantity', 'count', 'value', 'price', 'cost', 'revenue', 'sales_amount')
+_NUMERIC_TYPES = ('float', 'bfloat', 'int', 'uint', 'decimal', 'numeric')
+_TYPE_WRAPPERS = ('nullable(', 'lowcardinality(')
+
+# Each category compiled into a single alternation so one scan classifies it
+_DIM_TABLE_RE = re.compile('|'.join(map(re.escape, _DIM_TABLE_PATS)))
+_ID_RE = re.compile('|'.join(map(re.escape, _ID_PATS)))
+_DIM_NUM_RE = re.compile('|'.join(map(re.escape, _DIM_NUM_PATS)))
+_FACT_RE = re.compile('|'.join(map(re.escape, _FACT_PATS)))
+# Whole base type name (e.g. Int32, Float64, Decimal(18, 2)), not Interval* or Point
+_NUMERIC_TYPE_RE = re.compile(r'(?:%s)\d*(?:[()]|$)' % '|'.join(map(re.escape, _NUMERIC_TYPES)))
+
+# Table names interpolated into generated DDL (identifiers cannot be bound as parameters)
+_IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# Separator in hierarchy relationship strings ("parent -> child", "col1 <-> col2")
+_SEP_RE = re.compile(r'\s*<?->\s*')
+
+# Parsed ERD relationship; fact_* is the side the relationship starts from
+Rel = namedtuple('Rel', ['fact_table', 'fact_col', 'dim_table', 'dim_col'])
+
+
+def _parse_relationships(raw: List[Any], table_name: str) -> List[Rel]:
+    """
+    Parse ERD relationships for a table once, so callers do not re-split strings.
+    
+    Supports "table1.column1 -> table2.column2" strings and dicts with
+    table1/column1/table2/column2 keys. Dict relationships are only kept when
+    they start from table_name.
+    
+    Args:
+        raw: Relationships as stored in metadata.erd
+        table_name: Table the relationships were loaded for
+        
+    Returns:
+        List of parsed Rel tuples
+    """
+    parsed = []
+    for rel in raw or []:
+        if isinstance(rel, str) and '->' in rel:
+            parts = rel.split('->')
+            if len(parts) == 2:
+                fact_part = parts[0].strip()
+                dim_part = parts[1].strip()
+                if '.' in fact_part:
+                    fact_split = fact_part.split('.')
+                    dim_split = dim_part.split('.')
+                    parsed.append(Rel(
+                        fact_split[0].strip(),
+                        fact_split[1].strip(),
+                        dim_split[0].strip(),
+                        dim_split[1].strip() if len(dim_split) > 1 else ''
+                    ))
+        elif isinstance(rel, dict):
+            if 'table1' in rel and rel.get('table1') == table_name:
+                parsed.append(Rel(
+                    rel.get('table1', ''),
+                    rel.get('column1', ''),
+                    rel.get('table2', ''),
+                    rel.get('column2', '')
+                ))
+    return parsed
+
+
+def _column_arrays(columns: List[Dict[str, Any]]) -> tuple:
+    """
+    Build the columns / column_details arrays stored in metadata.dimensional_model.
+    
+    Args:
+        columns: Column detail dicts (column_name, data_type, classification)
+        
+    Returns:
+        Tuple of (column names, "column_name:data_type:classification" strings)
+    """
+    columns_list = [col['column_name'] for col in columns]
+    column_details_json = [f"{col['column_name']}:{col['data_type']}:{col['classification']}" 
+                           for col in columns]
+    return columns_list, column_details_json
+
+
+# metadata.dimensional_model columns written for each recommendation type
+_DIM_INSERT_COLUMNS = (
+    'id', 'recommendation_timestamp', 'table_type', 'recommended_name', 'final_name',
+    'source_table', 'original_table_name', 'hierarchy_name',
+    'root_column', 'leaf_column', 'columns', 'column_details',
+    'total_columns', 'hierarchy_levels', 'metadata_json'
+)
+_FACT_INSERT_COLUMNS = (
+    'id', 'recommendation_timestamp', 'table_type', 'recommended_name', 'final_name',
+    'source_table', 'original_table_name', 'fact_columns',
+    'dimension_keys', 'columns', 'column_details', 'total_columns',
+    'relationships', 'metadata_json'
+)
+
+# Stage3 SQL templates, filled in per recommendation with str.format
+_STAGE3_CREATE_TMPL = """CREATE OR REPLACE TABLE gold.{name}
+ENGINE = MergeTree()
+{order}
+AS SELECT {cols}
+FROM silver.{source}
+LIMIT 0;"""
+
+# max_insert_threads lets the plain INSERT ... SELECT below form and write blocks
+# of the target table on several threads instead of a single writer thread
+_STAGE3_INSERT_TMPL = """INSERT INTO gold.{name} ({cols})
+SELECT {cols}
+FROM silver.{source}
+SETTINGS max_insert_threads = {max_insert_threads};"""
+
+_STAGE3_OPTIMIZE_TMPL = "OPTIMIZE TABLE gold.{name} FINAL;"
+
+# Stage4 K-Table SQL templates, filled in per fact table with str.format_map
+_STAGE4_DROP_TMPL = "DROP TABLE IF EXISTS gold.{name};"
+
+_STAGE4_CREATE_TMPL = """CREATE TABLE gold.{name} (
+    {defs}
+) ENGINE = MergeTree()
+ORDER BY ({order_by});"""
+
+_STAGE4_INSERT_TMPL = """INSERT INTO gold.{name} ({cols})
+SELECT {select}
+FROM gold.{fact} AS fact
+{joins};"""
+
+_STAGE4_OPTIMIZE_TMPL = "OPTIMIZE TABLE gold.{name} FINAL;"
+
 
 class DimensionalModelRecommender:
     """
@@ -45,129 +183,264 @@ class DimensionalModelRecommender:
             'relationships': []
         }
         
+        # OPTIMIZE ... FINAL rewrites the whole K-Table, so stage4 only emits it on request
+        model_settings = Config().get_config().get('model_settings', {})
+        self.emit_optimize_final = bool(model_settings.get('emit_optimize_final', False))
+        
+        # Writer threads for the generated stage3 INSERT ... SELECT
+        self.stage3_max_insert_threads = max(1, int(model_settings.get('stage3_max_insert_threads', 8)))
+    
+    # analyze_metadata result shared across instances (routes create one per request),
+    # stored as (freshness_token, metadata) and reused while the token is unchanged
+    _metadata_cache = None
+    
+    def _metadata_freshness_token(self) -> Optional[tuple]:
+        """
+        Get a cheap token that changes whenever the metadata read by analyze_metadata changes.
+        
+        Row counts and timestamps catch new analyses; the newest active part of the
+        metadata tables catches in-place edits (ALTER ... UPDATE rewrites the parts).
+        
+        Returns:
+            Tuple of max timestamps/versions, row counts and part statistics,
+            or None if it cannot be determined
+        """
+        try:
+            token_query = """
+            SELECT
+                (SELECT max(analysis_timestamp) FROM metadata.erd) AS erd_ts,
+                (SELECT count() FROM metadata.erd) AS erd_rows,
+                (SELECT max(analysis_timestamp) FROM metadata.hierarchies) AS hierarchy_ts,
+                (SELECT count() FROM metadata.hierarchies) AS hierarchy_rows,
+                (SELECT max(version) FROM metadata.discover) AS discover_version,
+                (SELECT count() FROM metadata.discover) AS discover_rows,
+                (SELECT groupArray(name) FROM system.tables
+                 WHERE database = 'silver' AND name LIKE '%_stage1') AS stage1_tables,
+                (SELECT (max(modification_time), count()) FROM system.parts
+                 WHERE database = 'metadata' AND active
+                 AND table IN ('erd', 'hierarchies', 'discover')) AS metadata_parts
+            """
+            
+            result = self.db_manager.execute_query_dict(token_query)
+            if not result:
+                return None
+            row = result[0]
+            return tuple(
+                tuple(sorted(value)) if isinstance(value, list) else value
+                for value in row.values()
+            )
+        except Exception as e:
+            logger.debug(f"Could not determine metadata freshness token: {e}")
+            return None
+        
+    def _load_erd_metadata(self) -> Dict[str, Any]:
+        """Load the most recent ERD entry per table (deduplicated server-side)."""
+        erd_query = """
+        SELECT 
+            table_name,
+            table_type,
+            fact_columns,
+            dimension_columns,
+            relationships,
+            primary_key_candidates
+        FROM metadata.erd
+        ORDER BY analysis_timestamp DESC
+        LIMIT 1 BY table_name
+        """
+        
+        erd_results = self.db_manager.execute_query_dict(erd_query)
+        erd = {row['table_name']: row for row in erd_results}
+        
+        # Parse relationship strings once per table
+        for table_name, row in erd.items():
+            row['_parsed_rels'] = _parse_relationships(row.get('relationships'), table_name)
+        
+        logger.info(f"Loaded ERD metadata for {len(erd)} tables")
+        return {'erd': erd}
+    
+    def _load_hierarchy_metadata(self) -> Dict[str, Any]:
+        """Load the most recent hierarchy entry per table (deduplicated server-side)."""
+        hierarchy_query = """
+        SELECT 
+            table_name,
+            hierarchy_name,
+            root_column,
+            leaf_column,
+            intermediate_levels,
+            parent_child_relationships,
+            sibling_relationships
+        FROM metadata.hierarchies
+        ORDER BY analysis_timestamp DESC
+        LIMIT 1 BY table_name
+        """
+        
+        hierarchy_results = self.db_manager.execute_query_dict(hierarchy_query)
+        hierarchies = {row['table_name']: row for row in hierarchy_results}
+        
+        logger.info(f"Loaded hierarchy metadata for {len(hierarchies)} tables")
+        return {'hierarchies': hierarchies}
+    
+    def _load_discover_metadata(self) -> Dict[str, Any]:
+        """Load discover metadata (for column type validation), grouped by table."""
+        # Grouped per table server-side, one row per table
+        discover_query = """
+        SELECT 
+            original_table_name,
+            groupArray(tuple(new_column_name, inferred_type, classification, cardinality)) AS cols
+        FROM metadata.discover
+        WHERE original_table_name LIKE '%_stage1'
+        OR original_table_name IN (
+            SELECT DISTINCT REPLACE(table_name, '_stage1', '') 
+            FROM metadata.hierarchies
+        )
+        GROUP BY original_table_name
+        """
+        
+        discover_results = self.db_manager.execute_query_dict(discover_query)
+        
+        # Unpack into one dict per column, keyed by table
+        discover = {
+            row['original_table_name']: [
+                {
+                    'original_table_name': row['original_table_name'],
+                    'new_column_name': new_column_name,
+                    'inferred_type': inferred_type,
+                    'classification': classification,
+                    'cardinality': cardinality
+                }
+                for new_column_name, inferred_type, classification, cardinality in row['cols']
+            ]
+            for row in discover_results
+        }
+        
+        # Column -> inferred type lookup per table, built once for all fact tables
+        discover_types = {
+            table: {
+                (row.get('new_column_name') or row.get('original_column_name')): row.get('inferred_type', 'String')
+                for row in rows
+            }
+            for table, rows in discover.items()
+        }
+        
+        logger.info(f"Loaded discover metadata for {len(discover)} tables")
+        return {'discover': discover, 'discover_types': discover_types}
+    
+    def _load_stage1_tables(self) -> Dict[str, Any]:
+        """Load the list of Stage 1 tables in the silver schema."""
+        tables_query = """
+        SELECT name 
+        FROM system.tables 
+        WHERE database = 'silver' 
+        AND name LIKE '%_stage1'
+        ORDER BY name
+        """
+        
+        table_results = self.db_manager.execute_query_dict(tables_query)
+        stage1_tables = [row['name'] for row in table_results]
+        
+        logger.info(f"Found {len(stage1_tables)} Stage 1 tables")
+        return {'stage1_tables': stage1_tables}
+    
     def analyze_metadata(self) -> Dict[str, Any]:
         """
         Analyze all relevant metadata to understand the data model.
         
+        The ERD, hierarchy, discover and Stage 1 table lookups are independent,
+        so they run concurrently. Results are cached and reused until any of
+        that metadata changes.
+        
         Returns:
-            Dict containing ERD, hierarchy, and discover metadata
+            Dict containing ERD, hierarchy, and discover metadata. The result and its
+            sections are copies, but the per-table entries are shared with the cache
+            and must be treated as read-only.
         """
+        token = self._metadata_freshness_token()
+        cached = DimensionalModelRecommender._metadata_cache
+        if token is not None and cached is not None and cached[0] == token:
+            logger.info("Using cached metadata for dimensional model recommendations")
+            return self._copy_metadata(cached[1])
+        
         logger.info("Analyzing metadata for dimensional model recommendations...")
         
         metadata = {
             'erd': {},
             'hierarchies': {},
             'discover': {},
+            'discover_types': {},
             'stage1_tables': []
         }
         
-        # Get ERD metadata
-        try:
-            erd_query = """
-            SELECT 
-                table_name,
-                table_type,
-                fact_columns,
-                dimension_columns,
-                relationships,
-                primary_key_candidates
-            FROM metadata.erd
-            ORDER BY analysis_timestamp DESC
-            """
-            
-            erd_results = self.db_manager.execute_query_dict(erd_query)
-            
-            # Get most recent entry per table
-            for row in erd_results:
-                table_name = row['table_name']
-                if table_name not in metadata['erd']:
-                    metadata['erd'][table_name] = row
-            
-            logger.info(f"Loaded ERD metadata for {len(metadata['erd'])} tables")
-            
-        except Exception as e:
-            logger.warning(f"Error loading ERD metadata: {e}")
+        loaders = {
+            'ERD metadata': self._load_erd_metadata,
+            'hierarchy metadata': self._load_hierarchy_metadata,
+            'discover metadata': self._load_discover_metadata,
+            'Stage 1 tables': self._load_stage1_tables
+        }
         
-        # Get hierarchy metadata
-        try:
-            hierarchy_query = """
-            SELECT 
-                table_name,
-                hierarchy_name,
-                root_column,
-                leaf_column,
-                intermediate_levels,
-                parent_child_relationships,
-                sibling_relationships
-            FROM metadata.hierarchies
-            ORDER BY analysis_timestamp DESC
-            """
-            
-            hierarchy_results = self.db_manager.execute_query_dict(hierarchy_query)
-            
-            # Get most recent entry per table
-            for row in hierarchy_results:
-                table_name = row['table_name']
-                if table_name not in metadata['hierarchies']:
-                    metadata['hierarchies'][table_name] = row
-            
-            logger.info(f"Loaded hierarchy metadata for {len(metadata['hierarchies'])} tables")
-            
-        except Exception as e:
-            logger.warning(f"Error loading hierarchy metadata: {e}")
+        # The shared DatabaseManager workers keep their ClickHouse clients between calls
+        executor = self.db_manager.get_worker_executor()
+        futures = {executor.submit(loader): label for label, loader in loaders.items()}
+        for future in as_completed(futures):
+            try:
+                metadata.update(future.result())
+            except Exception as e:
+                logger.warning(f"Error loading {futures[future]}: {e}")
+                token = None  # do not cache a partial load
         
-        # Get discover metadata (for column type validation)
-        try:
-            discover_query = """
-            SELECT 
-                original_table_name,
-                new_column_name,
-                inferred_type,
-                classification,
-                cardinality
-            FROM metadata.discover
-            WHERE original_table_name LIKE '%_stage1'
-            OR original_table_name IN (
-                SELECT DISTINCT REPLACE(table_name, '_stage1', '') 
-                FROM metadata.hierarchies
-            )
-            """
-            
-            discover_results = self.db_manager.execute_query_dict(discover_query)
-            
-            # Group by table
-            for row in discover_results:
-                table_name = row['original_table_name']
-                if table_name not in metadata['discover']:
-                    metadata['discover'][table_name] = []
-                metadata['discover'][table_name].append(row)
-            
-            logger.info(f"Loaded discover metadata for {len(metadata['discover'])} tables")
+        if token is not None:
+            DimensionalModelRecommender._metadata_cache = (token, metadata)
+        
+        return self._copy_metadata(metadata)
+    
+    @staticmethod
+    def _copy_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy the metadata dict and its section containers so callers cannot alter the cached result."""
+        return {
+            key: value.copy() if isinstance(value, (dict, list)) else value
+            for key, value in metadata.items()
+        }
+    
+    def _load_all_column_structures(self, tables: List[str], schema_name: str = 'silver') -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Load column structures for several tables with a single system.columns query.
+        
+        Args:
+            tables: Table names to load
+            schema_name: Database the tables live in
             
-        except Exception as e:
-            logger.warning(f"Error loading discover metadata: {e}")
+        Returns:
+            Dict mapping table name to its columns (column_name, data_type) in position order
+        """
+        structures = defaultdict(list)
+        if not tables:
+            return structures
         
-        # Get list of stage1 tables
         try:
-            tables_query = """
-            SELECT name 
-            FROM system.tables 
-            WHERE database = 'silver' 
-            AND name LIKE '%_stage1'
-            ORDER BY name
+            structure_query = """
+            SELECT 
+                table,
+                name as column_name,
+                type as data_type
+            FROM system.columns 
+            WHERE database = {schema_name:String}
+            AND table IN {tables:Array(String)}
+            ORDER BY table, position
             """
             
-            table_results = self.db_manager.execute_query_dict(tables_query)
-            metadata['stage1_tables'] = [row['name'] for row in table_results]
-            
-            logger.info(f"Found {len(metadata['stage1_tables'])} Stage 1 tables")
+            structure_cols = self.db_manager.execute_query_iter(
+                structure_query,
+                parameters={'schema_name': schema_name, 'tables': list(tables)}
+            )
             
+            for col in structure_cols:
+                structures[col['table']].append(col)
         except Exception as e:
-            logger.warning(f"Error discovering Stage 1 tables: {e}")
+            logger.warning(f"Error getting column structures for {schema_name} tables: {e}")
         
-        return metadata
+        return structures
     
-    def identify_dimension_tables(self, metadata: Dict[str, Any], fact_table_names: Set[str]) -> List[Dict[str, Any]]:
+    def identify_dimension_tables(self, metadata: Dict[str, Any], fact_table_names: Set[str],
+                                  column_structures: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
         """
         Identify dimension tables based on hierarchies.
         
@@ -179,6 +452,7 @@ class DimensionalModelRecommender:
         Args:
             metadata: Analyzed metadata dictionary
             fact_table_names: Set of table names that are identified as fact tables (to exclude)
+            column_structures: Pre-loaded silver column structures by table (loaded if omitted)
             
         Returns:
             List of dimension table recommendations
@@ -186,46 +460,33 @@ class DimensionalModelRecommender:
         dimension_tables = []
         dim_counter = 1
         
+        if column_structures is None:
+            column_structures = self._load_all_column_structures(
+                [t for t in metadata['hierarchies'] if t not in fact_table_names]
+            )
+        
         for table_name, hierarchy_info in metadata['hierarchies'].items():
             # Skip tables that are identified as fact tables
             if table_name in fact_table_names:
                 continue
-            # Collect all columns that should be in this dimension
-            dimension_columns = set()
-            
-            # Add root column
-            if hierarchy_info.get('root_column'):
-                dimension_columns.add(hierarchy_info['root_column'])
-            
-            # Add leaf column
-            if hierarchy_info.get('leaf_column'):
-                dimension_columns.add(hierarchy_info['leaf_column'])
-            
-            # Add intermediate levels
-            intermediate = hierarchy_info.get('intermediate_levels', [])
-            if intermediate:
-                for col in intermediate:
-                    dimension_columns.add(col)
-            
-            # Add columns from parent-child relationships
-            parent_child = hierarchy_info.get('parent_child_relationships', [])
-            for rel in parent_child:
-                # Parse "parent -> child" format
+            # Collect all columns that should be in this dimension:
+            # root, leaf, intermediate levels, and both sides of
+            # "parent -> child" / "col1 <-> col2" relationships
+            dimension_columns = {hierarchy_info.get('root_column'), hierarchy_info.get('leaf_column')}
+            dimension_columns.update(hierarchy_info.get('intermediate_levels') or ())
+            for rel in hierarchy_info.get('parent_child_relationships') or ():
                 if '->' in rel:
-                    parts = [p.strip() for p in rel.split('->')]
-                    dimension_columns.update(parts)
-            
-            # Add columns from sibling relationships
-            siblings = hierarchy_info.get('sibling_relationships', [])
-            for sib in siblings:
-                # Parse "col1 <-> col2" format
+                    dimension_columns.update(part.strip() for part in _SEP_RE.split(rel))
+            for sib in hierarchy_info.get('sibling_relationships') or ():
                 if '<->' in sib:
-                    parts = [p.strip() for p in sib.split('<->')]
-                    dimension_columns.update(parts)
+                    dimension_columns.update(part.strip() for part in _SEP_RE.split(sib))
+            dimension_columns.discard(None)
+            dimension_columns.discard('')
             
             # Get full column information from discover metadata
             original_table_name = table_name.replace('_stage1', '')
             column_details = []
+            seen_cols = set()
             
             if original_table_name in metadata['discover']:
                 for col_info in metadata['discover'][original_table_name]:
@@ -237,38 +498,25 @@ class DimensionalModelRecommender:
                             'classification': col_info.get('classification', 'dimension'),
                             'cardinality': col_info.get('cardinality', 0)
                         })
+                        seen_cols.add(col_name)
             
             # Also get columns directly from the stage1 table structure
             # to ensure we have all dimension columns
-            try:
-                structure_query = f"""
-                SELECT 
-                    name as column_name,
-                    type as data_type
-                FROM system.columns 
-                WHERE database = 'silver' 
-                AND table = '{table_name}'
-                ORDER BY position
-                """
-                
-                structure_cols = self.db_manager.execute_query_dict(structure_query)
+            for col in column_structures.get(table_name, []):
+                col_name = col['column_name']
+                # Skip fact columns (numeric measures)
+                if self._is_fact_column(col['data_type'], col_name, table_name):
+                    continue
                 
-                for col in structure_cols:
-                    col_name = col['column_name']
-                    # Skip fact columns (numeric measures)
-                    if self._is_fact_column(col['data_type'], col_name, table_name):
-                        continue
-                    
-                    # Add to dimension columns if not already there
-                    if col_name not in [c['column_name'] for c in column_details]:
-                        column_details.append({
-                            'column_name': col_name,
-                            'data_type': col['data_type'],
-                            'classification': 'dimension',
-                            'cardinality': 0  # Will be calculated if needed
-                        })
-            except Exception as e:
-                logger.warning(f"Error getting column structure for {table_name}: {e}")
+                # Add to dimension columns if not already there
+                if col_name not in seen_cols:
+                    column_details.append({
+                        'column_name': col_name,
+                        'data_type': col['data_type'],
+                        'classification': 'dimension',
+                        'cardinality': 0  # Will be calculated if needed
+                    })
+                    seen_cols.add(col_name)
             
             # Create dimension table recommendation
             dim_table = {
@@ -278,17 +526,20 @@ class DimensionalModelRecommender:
                 'hierarchy_name': hierarchy_info.get('hierarchy_name', ''),
                 'root_column': hierarchy_info.get('root_column'),
                 'leaf_column': hierarchy_info.get('leaf_column'),
-                'columns': sorted(column_details, key=lambda x: x['column_name']),
+                'columns': sorted(column_details, key=itemgetter('column_name')),
                 'total_columns': len(column_details),
                 'hierarchy_levels': len(hierarchy_info.get('intermediate_levels', [])) + 2  # root + leaf
             }
+            # Storage arrays, built once here so store_recommendations does not re-walk the columns
+            dim_table['_columns_list'], dim_table['_column_details_json'] = _column_arrays(dim_table['columns'])
             
             dimension_tables.append(dim_table)
             dim_counter += 1
         
         return dimension_tables
     
-    def identify_fact_tables(self, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def identify_fact_tables(self, metadata: Dict[str, Any],
+                             column_structures: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
         """
         Identify fact tables based on ERD metadata and relationships.
         
@@ -299,6 +550,7 @@ class DimensionalModelRecommender:
         
         Args:
             metadata: Analyzed metadata dictionary
+            column_structures: Pre-loaded silver column structures by table (loaded if omitted)
             
         Returns:
             List of fact table recommendations
@@ -306,6 +558,11 @@ class DimensionalModelRecommender:
         fact_tables = []
         fact_counter = 1
         
+        if column_structures is None:
+            column_structures = self._load_all_column_structures(
+                [t for t, info in metadata['erd'].items() if info.get('table_type') == 'fact']
+            )
+        
         # Find fact tables from ERD metadata
         for table_name, erd_info in metadata['erd'].items():
             if erd_info.get('table_type') == 'fact':
@@ -313,26 +570,10 @@ class DimensionalModelRecommender:
                 dimension_columns = erd_info.get('dimension_columns', [])
                 relationships = erd_info.get('relationships', [])
                 
-                # Get column details from discover metadata
                 original_table_name = table_name.replace('_stage1', '')
-                column_details = []
                 
                 # Get all columns from table structure first
-                try:
-                    structure_query = f"""
-                    SELECT 
-                        name as column_name,
-                        type as data_type
-                    FROM system.columns 
-                    WHERE database = 'silver' 
-                    AND table = '{table_name}'
-                    ORDER BY position
-                    """
-                    
-                    structure_cols = self.db_manager.execute_query_dict(structure_query)
-                except Exception as e:
-                    logger.warning(f"Error getting column structure for {table_name}: {e}")
-                    structure_cols = []
+                structure_cols = column_structures.get(table_name, [])
                 
                 # Find dimension foreign keys from relationships and ERD metadata
                 dimension_keys = set()
@@ -341,75 +582,50 @@ class DimensionalModelRecommender:
                 if dimension_columns:
                     dimension_keys.update(dimension_columns)
                 
-                # Parse relationships to find dimension keys
-                if relationships:
-                    for rel in relationships:
-                        # Relationships are stored as strings, need to parse
-                        # Format: "table1.column1 -> table2.column2"
-                        if isinstance(rel, str) and '->' in rel:
-                            parts = rel.split('->')
-                            if len(parts) == 2:
-                                fact_part = parts[0].strip()
-                                if '.' in fact_part:
-                                    fact_col = fact_part.split('.')[1].strip()
-                                    # If this is a column from our fact table, it's a dimension key
-                                    if fact_col:
-                                        dimension_keys.add(fact_col)
-                        elif isinstance(rel, dict):
-                            # Relationship dict format
-                            if 'table1' in rel and rel.get('table1') == table_name:
-                                fact_col = rel.get('column1', '')
-                                if fact_col:
-                                    dimension_keys.add(fact_col)
-                
-                # For fact tables, all non-fact columns should be dimension keys (foreign keys)
-                # Check table structure - any column that's not a fact is a dimension key
-                for col in structure_cols:
-                    col_name = col['column_name']
-                    # Skip fact columns (measures) - they're not dimension keys
-                    if not self._is_fact_column(col['data_type'], col_name, table_name):
-                        # For fact tables, any non-fact column is a dimension key
-                        dimension_keys.add(col_name)
-                
-                # Now build column_details: include both fact columns (measures) and dimension keys
+                # Relationship columns on the fact side are dimension keys
+                # (parsed once in analyze_metadata)
+                parsed_rels = erd_info.get('_parsed_rels')
+                if parsed_rels is None:
+                    parsed_rels = _parse_relationships(relationships, table_name)
+                dimension_keys.update(rel.fact_col for rel in parsed_rels if rel.fact_col)
+                
+                # Classify the table structure once: measures are fact columns, and
+                # for fact tables any non-fact column is a dimension key (foreign key)
+                fact_col_set = {
+                    col['column_name'] for col in structure_cols
+                    if self._is_fact_column(col['data_type'], col['column_name'], table_name)
+                }
+                dimension_keys.update(
+                    col['column_name'] for col in structure_cols if col['column_name'] not in fact_col_set
+                )
+                dim_key_only = dimension_keys - fact_col_set
                 
                 # Get data types from discover metadata if available
-                discover_col_types = {}
-                if original_table_name in metadata['discover']:
-                    for col_info in metadata['discover'][original_table_name]:
-                        col_name = col_info.get('new_column_name') or col_info.get('original_column_name')
-                        discover_col_types[col_name] = col_info.get('inferred_type', 'String')
+                discover_col_types = metadata.get('discover_types', {}).get(original_table_name, {})
                 
-                # Add fact columns (measures)
+                # Build column_details in a single pass: fact columns (measures) and dimension keys
+                fact_details = []
+                dim_key_details = []
                 for col in structure_cols:
                     col_name = col['column_name']
-                    if self._is_fact_column(col['data_type'], col_name, table_name):
-                        data_type = discover_col_types.get(col_name, col['data_type'])
-                        column_details.append({
-                            'column_name': col_name,
-                            'data_type': data_type,
-                            'classification': 'fact',
-                            'cardinality': 0
-                        })
-                
-                # Add dimension keys (foreign keys)
-                for col in structure_cols:
-                    col_name = col['column_name']
-                    if col_name in dimension_keys:
-                        # Make sure we haven't already added it as a fact column
-                        if col_name not in [c['column_name'] for c in column_details]:
-                            data_type = discover_col_types.get(col_name, col['data_type'])
-                            column_details.append({
-                                'column_name': col_name,
-                                'data_type': data_type,
-                                'classification': 'dimension_key',
-                                'cardinality': 0
-                            })
+                    if col_name in fact_col_set:
+                        target, classification = fact_details, 'fact'
+                    elif col_name in dim_key_only:
+                        target, classification = dim_key_details, 'dimension_key'
+                    else:
+                        continue
+                    target.append({
+                        'column_name': col_name,
+                        'data_type': discover_col_types.get(col_name, col['data_type']),
+                        'classification': classification,
+                        'cardinality': 0
+                    })
+                column_details = fact_details + dim_key_details
                 
                 # Create fact table recommendation
                 # Separate fact columns and dimension keys for clarity
-                fact_cols_list = [c['column_name'] for c in column_details if c['classification'] == 'fact']
-                dim_keys_list = [c['column_name'] for c in column_details if c['classification'] == 'dimension_key']
+                fact_cols_list = [c['column_name'] for c in fact_details]
+                dim_keys_list = [c['column_name'] for c in dim_key_details]
                 
                 fact_table = {
                     'recommended_name': f'fact{fact_counter}_fact',
@@ -417,20 +633,26 @@ class DimensionalModelRecommender:
                     'original_table_name': original_table_name,
                     'fact_columns': fact_cols_list,
                     'dimension_keys': dim_keys_list,
-                    'columns': sorted(column_details, key=lambda x: x['column_name']),
+                    'columns': sorted(column_details, key=itemgetter('column_name')),
                     'total_columns': len(column_details),
                     'relationships': relationships
                 }
+                # Storage arrays, built once here so store_recommendations does not re-walk the columns
+                fact_table['_columns_list'], fact_table['_column_details_json'] = _column_arrays(fact_table['columns'])
                 
                 fact_tables.append(fact_table)
                 fact_counter += 1
         
         return fact_tables
     
-    def _is_fact_column(self, data_type: str, column_name: str, table_name: str) -> bool:
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _is_fact_column(data_type: str, column_name: str, table_name: str) -> bool:
         """
         Determine if a column is a fact column (measure).
         
+        The result only depends on the arguments, so it is memoized across calls.
+        
         Args:
             data_type: Column data type
             column_name: Column name
@@ -444,28 +666,28 @@ class DimensionalModelRecommender:
         table_name_lower = table_name.lower()
         
         # Dimension tables - all columns are dimensions
-        dimension_table_patterns = ['calendar', 'time', 'date', 'dim']
-        if any(pattern in table_name_lower for pattern in dimension_table_patterns):
+        if _DIM_TABLE_RE.search(table_name_lower):
             return False
         
         # ID columns are dimensions
-        id_patterns = ['_id', '_key', 'id_', 'key_']
-        if any(pattern in column_name_lower for pattern in id_patterns):
+        if _ID_RE.search(column_name_lower):
             return False
         
         # Numeric dimension attributes
-        dimension_numeric_patterns = ['_num', '_code', '_flag', 'is_', 'has_', 'working', '_year', '_day', '_month', '_qtr', '_week']
-        if any(pattern in column_name_lower for pattern in dimension_numeric_patterns):
+        if _DIM_NUM_RE.search(column_name_lower):
             return False
         
         # Fact measure patterns
-        fact_patterns = ['amount', 'total', 'sum', 'quantity', 'count', 'value', 'price', 'cost', 'revenue', 'sales_amount']
-        if any(pattern in column_name_lower for pattern in fact_patterns):
+        if _FACT_RE.search(column_name_lower):
             return True
         
-        # Numeric types are typically facts
-        numeric_types = ['float', 'int', 'uint', 'decimal', 'numeric']
-        if any(num_type in data_type_lower for num_type in numeric_types):
+        # Numeric types are typically facts. Only the base type counts once the
+        # Nullable/LowCardinality wrappers are removed: Arrays, Maps and Tuples of
+        # numbers are not additive measures, so they stay dimensions.
+        base_type = data_type_lower
+        while base_type.startswith(_TYPE_WRAPPERS):
+            base_type = base_type.split('(', 1)[1]
+        if _NUMERIC_TYPE_RE.match(base_type):
             return True
         
         return False
@@ -482,14 +704,19 @@ class DimensionalModelRecommender:
         # Analyze metadata
         metadata = self.analyze_metadata()
         
+        # Load silver column structures for every candidate table in one query
+        column_structures = self._load_all_column_structures(
+            sorted(set(metadata['erd']) | set(metadata['hierarchies']))
+        )
+        
         # Identify fact tables from ERD first
-        fact_tables = self.identify_fact_tables(metadata)
+        fact_tables = self.identify_fact_tables(metadata, column_structures)
         
         # Get set of fact table names to exclude from dimension recommendations
         fact_table_names = {ft['source_table'] for ft in fact_tables}
         
         # Identify dimension tables from hierarchies (excluding fact tables)
-        dimension_tables = self.identify_dimension_tables(metadata, fact_table_names)
+        dimension_tables = self.identify_dimension_tables(metadata, fact_table_names, column_structures)
         
         recommendations = {
             'recommendation_timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
@@ -553,60 +780,64 @@ class DimensionalModelRecommender:
             self.db_manager.execute_command(create_table_sql)
             
             # Add final_name column if table exists but column doesn't (for existing tables)
-            # Try to add the column - it will fail if it already exists, which is fine
-            try:
-                alter_sql = "ALTER TABLE metadata.dimensional_model ADD COLUMN final_name String"
-                self.db_manager.execute_command(alter_sql)
-                logger.info("Added final_name column to existing table")
-            except Exception as e:
-                # Column likely already exists or table is new - that's fine
-                logger.debug(f"final_name column may already exist: {e}")
+            self.db_manager.execute_command(
+                "ALTER TABLE metadata.dimensional_model ADD COLUMN IF NOT EXISTS final_name String"
+            )
             
             # Truncate existing recommendations
             self.db_manager.execute_command("TRUNCATE TABLE metadata.dimensional_model")
+            DimensionalModelRecommender._gold_erd_cache = None
+            
+            recommendation_timestamp = recommendations['recommendation_timestamp']
+            if isinstance(recommendation_timestamp, str):
+                recommendation_timestamp = datetime.strptime(recommendation_timestamp, '%Y-%m-%d %H:%M:%S')
             
-            # Store dimension tables
+            # Store dimension tables (one batch insert)
+            dim_rows = []
             for dim_table in recommendations['dimension_tables']:
-                columns_list = [col['column_name'] for col in dim_table['columns']]
-                column_details_json = [f"{col['column_name']}:{col['data_type']}:{col['classification']}" 
-                                      for col in dim_table['columns']]
+                if '_columns_list' in dim_table:
+                    columns_list = dim_table['_columns_list']
+                    column_details_json = dim_table['_column_details_json']
+                else:
+                    columns_list, column_details_json = _column_arrays(dim_table['columns'])
                 
                 # Initialize final_name with recommended_name
                 recommended_name = dim_table['recommended_name']
                 final_name = recommended_name  # Initially same as recommended_name
                 
-                insert_sql = f"""
-                INSERT INTO metadata.dimensional_model (
-                    id, recommendation_timestamp, table_type, recommended_name, final_name,
-                    source_table, original_table_name, hierarchy_name,
-                    root_column, leaf_column, columns, column_details,
-                    total_columns, hierarchy_levels, metadata_json
-                ) VALUES (
-                    {hash(f"{recommended_name}_{dim_table['source_table']}") % 2**63},
-                    '{recommendations['recommendation_timestamp']}',
+                dim_rows.append([
+                    zlib.crc32(f"{recommended_name}_{dim_table['source_table']}".encode()),
+                    recommendation_timestamp,
                     'dimension',
-                    '{recommended_name}',
-                    '{final_name}',
-                    '{dim_table['source_table']}',
-                    '{dim_table['original_table_name']}',
-                    '{dim_table.get('hierarchy_name', '').replace("'", "''")}',
-                    '{dim_table.get('root_column', '')}',
-                    '{dim_table.get('leaf_column', '')}',
-                    {repr(columns_list)},
-                    {repr(column_details_json)},
-                    {dim_table['total_columns']},
-                    {dim_table.get('hierarchy_levels', 0)},
-                    '{str(dim_table).replace("'", "''")[:1000]}'
-                )
-                """
-                
-                self.db_manager.execute_command(insert_sql)
+                    recommended_name,
+                    final_name,
+                    dim_table['source_table'],
+                    dim_table['original_table_name'],
+                    dim_table.get('hierarchy_name') or '',
+                    dim_table.get('root_column') or '',
+                    dim_table.get('leaf_column') or '',
+                    columns_list,
+                    column_details_json,
+                    dim_table['total_columns'],
+                    dim_table.get('hierarchy_levels', 0),
+                    json.dumps({k: v for k, v in dim_table.items() if not k.startswith('_')}, default=str)
+                ])
             
-            # Store fact tables
+            if not self.db_manager.insert_rows(
+                'metadata.dimensional_model',
+                dim_rows,
+                column_names=_DIM_INSERT_COLUMNS
+            ):
+                raise RuntimeError("Failed to insert dimension table recommendations")
+            
+            # Store fact tables (one batch insert)
+            fact_rows = []
             for fact_table in recommendations['fact_tables']:
-                columns_list = [col['column_name'] for col in fact_table['columns']]
-                column_details_json = [f"{col['column_name']}:{col['data_type']}:{col['classification']}" 
-                                      for col in fact_table['columns']]
+                if '_columns_list' in fact_table:
+                    columns_list = fact_table['_columns_list']
+                    column_details_json = fact_table['_column_details_json']
+                else:
+                    columns_list, column_details_json = _column_arrays(fact_table['columns'])
                 relationships_list = fact_table.get('relationships', [])
                 if isinstance(relationships_list, str):
                     relationships_list = [relationships_list]
@@ -615,31 +846,29 @@ class DimensionalModelRecommender:
                 recommended_name = fact_table['recommended_name']
                 final_name = recommended_name  # Initially same as recommended_name
                 
-                insert_sql = f"""
-                INSERT INTO metadata.dimensional_model (
-                    id, recommendation_timestamp, table_type, recommended_name, final_name,
-                    source_table, original_table_name, fact_columns,
-                    dimension_keys, columns, column_details, total_columns,
-                    relationships, metadata_json
-                ) VALUES (
-                    {hash(f"{recommended_name}_{fact_table['source_table']}") % 2**63},
-                    '{recommendations['recommendation_timestamp']}',
+                fact_rows.append([
+                    zlib.crc32(f"{recommended_name}_{fact_table['source_table']}".encode()),
+                    recommendation_timestamp,
                     'fact',
-                    '{recommended_name}',
-                    '{final_name}',
-                    '{fact_table['source_table']}',
-                    '{fact_table['original_table_name']}',
-                    {repr(fact_table.get('fact_columns', []))},
-                    {repr(fact_table.get('dimension_keys', []))},
-                    {repr(columns_list)},
-                    {repr(column_details_json)},
-                    {fact_table['total_columns']},
-                    {repr(relationships_list)},
-                    '{str(fact_table).replace("'", "''")[:1000]}'
-                )
-                """
-                
-                self.db_manager.execute_command(insert_sql)
+                    recommended_name,
+                    final_name,
+                    fact_table['source_table'],
+                    fact_table['original_table_name'],
+                    list(fact_table.get('fact_columns', [])),
+                    list(fact_table.get('dimension_keys', [])),
+                    columns_list,
+                    column_details_json,
+                    fact_table['total_columns'],
+                    [str(rel) for rel in relationships_list],
+                    json.dumps({k: v for k, v in fact_table.items() if not k.startswith('_')}, default=str)
+                ])
+            
+            if not self.db_manager.insert_rows(
+                'metadata.dimensional_model',
+                fact_rows,
+                column_names=_FACT_INSERT_COLUMNS
+            ):
+                raise RuntimeError("Failed to insert fact table recommendations")
             
             logger.info(f"Stored {recommendations['total_dimension_tables']} dimension and "
                        f"{recommendations['total_fact_tables']} fact table recommendations")
@@ -649,15 +878,130 @@ class DimensionalModelRecommender:
             logger.error(f"Error storing recommendations: {e}")
             return False
     
+    def _build_stage3_statements(self, rec: Dict[str, Any], final_name: str) -> tuple:
+        """
+        Build the stage3 SQL statements and transformation metadata for one recommendation.
+        
+        Pure string building with no database access; transformation ids are
+        assigned by the caller so they stay sequential.
+        
+        Args:
+            rec: Recommendation row from metadata.dimensional_model
+            final_name: Validated gold table name for the recommendation
+            
+        Returns:
+            Tuple of (statements, custom_metadata) where statements is a list of
+            dicts with execution_sequence, sql_statement and statement_type
+        """
+        recommended_name = rec['recommended_name']
+        table_type = rec['table_type']
+        source_table = rec['source_table']
+        # Normalize column entries to plain names once; everything below uses strings
+        columns = [col if isinstance(col, str) else col.get('column_name', str(col)) for col in (rec.get('columns') or [])]
+        column_details = rec.get('column_details', [])
+        
+        # Parse column details to get data types for the column mappings metadata
+        # Format: "column_name:data_type:classification"
+        column_types = dict(
+            detail.split(':', 2)[:2]
+            for detail in column_details
+            if isinstance(detail, str) and ':' in detail
+        )
+        
+        columns_set = set(columns)
+        
+        statements = []
+        
+        # Statement 1: CREATE OR REPLACE TABLE
+        # Replacing atomically avoids a separate DROP round-trip and the window
+        # where gold.final_name does not exist for downstream readers.
+        # Column types are inferred by ClickHouse from the silver source
+        # (CREATE ... AS SELECT ... LIMIT 0), so the DDL no longer needs a
+        # system.columns lookup to assemble column definitions client-side.
+        # Determine ORDER BY clause based on table type
+        if table_type == 'fact':
+            # For fact tables, order by dimension keys (foreign keys)
+            dim_keys_set = set(rec.get('dimension_keys') or ())
+            order_by_cols = [col for col in columns if col in dim_keys_set]
+            if not order_by_cols:
+                # Fallback to first few columns
+                order_by_cols = columns[:3] if len(columns) >= 3 else columns
+            order_by = f"ORDER BY ({', '.join(order_by_cols)})"
+        else:
+            # For dimension tables, order by root/leaf columns or primary key
+            root_col = rec.get('root_column')
+            leaf_col = rec.get('leaf_column')
+            if root_col and root_col in columns_set:
+                order_by = f"ORDER BY ({root_col})"
+            elif leaf_col and leaf_col in columns_set:
+                order_by = f"ORDER BY ({leaf_col})"
+            else:
+                # Use first column as fallback
+                order_by = f"ORDER BY ({columns[0]})" if columns else "ORDER BY tuple()"
+        
+        # Map columns from silver to gold (assuming same names for now)
+        cols_sql = ', '.join(columns)
+        create_sql = _STAGE3_CREATE_TMPL.format(
+            name=final_name, order=order_by, cols=cols_sql, source=source_table
+        )
+        
+        statements.append({
+            'execution_sequence': 1,
+            'sql_statement': create_sql,
+            'statement_type': 'CREATE'
+        })
+        
+        # Statement 2: INSERT INTO ... SELECT
+        insert_sql = _STAGE3_INSERT_TMPL.format(
+            name=final_name, cols=cols_sql, source=source_table,
+            max_insert_threads=self.stage3_max_insert_threads
+        )
+        
+        statements.append({
+            'execution_sequence': 2,
+            'sql_statement': insert_sql,
+            'statement_type': 'INSERT'
+        })
+        
+        # Statement 3: OPTIMIZE TABLE
+        optimize_sql = _STAGE3_OPTIMIZE_TMPL.format(name=final_name)
+        statements.append({
+            'execution_sequence': 3,
+            'sql_statement': optimize_sql,
+            'statement_type': 'OPTIMIZE'
+        })
+        
+        custom_metadata = {
+            'source_table': f'silver.{source_table}',
+            'target_table': f'gold.{final_name}',
+            'generated_from': 'dimensional_model_recommendations',
+            'transformation_schema_name': 'metadata',
+            'dependencies': [],
+            'execution_frequency': 'daily',
+            'table_type': table_type,
+            'recommended_name': recommended_name,
+            'source_schema': 'silver',
+            'target_schema': 'gold',
+            'column_mappings': [
+                {
+                    'source': col_name,
+                    'target': col_name,
+                    'type': column_types.get(col_name, 'String')
+                }
+                for col_name in columns
+            ]
+        }
+        
+        return statements, custom_metadata
+    
     def generate_stage3_transformations(self) -> Dict[str, Any]:
         """
         Generate stage3 transformation SQL for gold schema tables using the new SQL framework.
         
         For each recommendation, creates transformations with:
-        1. DROP TABLE IF EXISTS gold.final_name
-        2. CREATE TABLE gold.final_name with proper schema
-        3. INSERT INTO gold.final_name SELECT ... FROM silver.source_table
-        4. OPTIMIZE TABLE gold.final_name FINAL
+        1. CREATE OR REPLACE TABLE gold.final_name AS SELECT ... LIMIT 0 (schema inferred from silver)
+        2. INSERT INTO gold.final_name SELECT ... FROM silver.source_table
+        3. OPTIMIZE TABLE gold.final_name FINAL
         
         Uses the new JSON-based SQL storage framework (SQLTransformation, SQLParser, TransformationStorage)
         similar to how generate-stage1-from-discovery works.
@@ -681,146 +1025,54 @@ class DimensionalModelRecommender:
             ORDER BY table_type, recommended_name
             """
             
-            recommendations = self.db_manager.execute_query_dict(query)
+            # Next transformation_id comes from transformation3. Kept as its own query so a
+            # missing or unreadable transformation3 falls back to id 1 instead of failing
+            # the whole generation (execute_query_dict returns None on error).
+            max_id_query = """
+            SELECT COALESCE(MAX(transformation_id), 0) as max_id
+            FROM metadata.transformation3
+            """
+            max_result = self.db_manager.execute_query_dict(max_id_query)
             
-            if not recommendations:
+            # Recommendations are streamed; peek the first row to detect an empty model
+            recommendations = self.db_manager.execute_query_iter(query)
+            first_rec = next(recommendations, None)
+            
+            if first_rec is None:
                 return {
                     "status": "error",
                     "message": "No recommendations found. Generate recommendations first.",
                     "transformations_created": 0
                 }
             
-            # Get next transformation_id from transformation3 table
-            max_id_query = """
-            SELECT COALESCE(MAX(transformation_id), 0) as max_id
-            FROM metadata.transformation3
-            """
-            max_result = self.db_manager.execute_query_dict(max_id_query)
             next_transformation_id = (max_result[0]['max_id'] if max_result and max_result[0].get('max_id') else 0) + 1
             
             # Initialize storage for new framework
             storage = TransformationStorage(self.db_manager)
             
             transformations_created = []
+            pending = []
+            skipped = 0
             
-            for rec in recommendations:
+            for rec in chain((first_rec,), recommendations):
                 recommended_name = rec['recommended_name']
                 final_name = rec.get('final_name') or recommended_name
                 table_type = rec['table_type']
                 source_table = rec['source_table']
-                columns = rec.get('columns', [])
-                column_details = rec.get('column_details', [])
                 
                 # Skip if no final_name set
                 if not final_name or final_name == recommended_name:
-                    logger.warning(f"Skipping {recommended_name} - final_name not set or same as recommended_name")
+                    skipped += 1
                     continue
                 
-                # Parse column details to get data types
-                # Format: "column_name:data_type:classification"
-                column_types = {}
-                for detail in column_details:
-                    if isinstance(detail, str) and ':' in detail:
-                        parts = detail.split(':')
-                        if len(parts) >= 2:
-                            col_name = parts[0]
-                            data_type = parts[1]
-                            column_types[col_name] = data_type
-                
-                # Also get actual column types from source table to ensure accuracy
-                try:
-                    source_cols_query = f"""
-                    SELECT 
-                        name as column_name,
-                        type as data_type
-                    FROM system.columns
-                    WHERE database = 'silver'
-                        AND table = '{source_table}'
-                    ORDER BY position
-                    """
-                    source_cols = self.db_manager.execute_query_dict(source_cols_query)
-                    # Override with actual types from source table
-                    for col in source_cols:
-                        col_name = col['column_name']
-                        if col_name in columns:  # Only include columns in our recommendation
-                            column_types[col_name] = col['data_type']
-                except Exception as e:
-                    logger.warning(f"Could not get column types from source table {source_table}: {e}")
-                    # Continue with types from column_details
+                if not (_IDENTIFIER_RE.match(final_name) and _IDENTIFIER_RE.match(source_table)):
+                    logger.warning(f"Skipping {recommended_name} - invalid table name '{final_name}' or '{source_table}'")
+                    continue
                 
                 # Generate transformation name (use final_name as the transformation name)
                 transformation_name = final_name
                 
-                statements = []
-                
-                # Statement 1: DROP TABLE IF EXISTS
-                drop_sql = f"DROP TABLE IF EXISTS gold.{final_name};"
-                statements.append({
-                    'execution_sequence': 1,
-                    'sql_statement': drop_sql,
-                    'statement_type': 'DROP'
-                })
-                
-                # Statement 2: CREATE TABLE
-                # Build column definitions
-                column_defs = []
-                for col in columns:
-                    col_name = col if isinstance(col, str) else col.get('column_name', str(col))
-                    # Get data type from column_types or default to String
-                    data_type = column_types.get(col_name, 'String')
-                    column_defs.append(f"{col_name} {data_type}")
-                
-                # Determine ORDER BY clause based on table type
-                if table_type == 'fact':
-                    # For fact tables, order by dimension keys (foreign keys)
-                    order_by_cols = [col for col in columns if col in rec.get('dimension_keys', [])]
-                    if not order_by_cols:
-                        # Fallback to first few columns
-                        order_by_cols = columns[:3] if len(columns) >= 3 else columns
-                    order_by = f"ORDER BY ({', '.join(order_by_cols)})"
-                else:
-                    # For dimension tables, order by root/leaf columns or primary key
-                    root_col = rec.get('root_column')
-                    leaf_col = rec.get('leaf_column')
-                    if root_col and root_col in columns:
-                        order_by = f"ORDER BY ({root_col})"
-                    elif leaf_col and leaf_col in columns:
-                        order_by = f"ORDER BY ({leaf_col})"
-                    else:
-                        # Use first column as fallback
-                        order_by = f"ORDER BY ({columns[0]})" if columns else "ORDER BY tuple()"
-                
-                create_sql = f"""CREATE TABLE gold.{final_name} (
-    {', '.join(column_defs)}
-) ENGINE = MergeTree()
-{order_by};"""
-                
-                statements.append({
-                    'execution_sequence': 2,
-                    'sql_statement': create_sql,
-                    'statement_type': 'CREATE'
-                })
-                
-                # Statement 3: INSERT INTO ... SELECT
-                # Map columns from silver to gold (assuming same names for now)
-                select_cols = [col if isinstance(col, str) else col.get('column_name', str(col)) for col in columns]
-                insert_sql = f"""INSERT INTO gold.{final_name} ({', '.join(select_cols)})
-SELECT {', '.join(select_cols)}
-FROM silver.{source_table};"""
-                
-                statements.append({
-                    'execution_sequence': 3,
-                    'sql_statement': insert_sql,
-                    'statement_type': 'INSERT'
-                })
-                
-                # Statement 4: OPTIMIZE TABLE
-                optimize_sql = f"OPTIMIZE TABLE gold.{final_name} FINAL;"
-                statements.append({
-                    'execution_sequence': 4,
-                    'sql_statement': optimize_sql,
-                    'statement_type': 'OPTIMIZE'
-                })
+                statements, custom_metadata = self._build_stage3_statements(rec, final_name)
                 
                 # Convert each statement to the new framework and store
                 for statement in statements:
@@ -831,35 +1083,11 @@ FROM silver.{source_table};"""
                         transformation_id=next_transformation_id,
                         transformation_name=transformation_name,
                         execution_sequence=statement['execution_sequence'],
-                        custom_metadata={
-                            'source_table': f'silver.{source_table}',
-                            'target_table': f'gold.{final_name}',
-                            'generated_from': 'dimensional_model_recommendations',
-                            'transformation_schema_name': 'metadata',
-                            'dependencies': [],
-                            'execution_frequency': 'daily',
-                            'table_type': table_type,
-                            'recommended_name': recommended_name,
-                            'source_schema': 'silver',
-                            'target_schema': 'gold',
-                            'column_mappings': [
-                                {
-                                    'source': col_name,
-                                    'target': col_name,
-                                    'type': column_types.get(col_name, 'String')
-                                }
-                                for col_name in columns
-                            ]
-                        }
+                        custom_metadata=custom_metadata
                     )
                     
-                    # Create transformation object
-                    transformation = SQLTransformation(transformation_data)
-                    
-                    # Store using the new framework
-                    success = storage.store_transformation(transformation)
-                    if not success:
-                        logger.error(f"Failed to store transformation {next_transformation_id}")
+                    # Create transformation object; stored in one batch after the loop
+                    pending.append(SQLTransformation(transformation_data))
                 
                 transformations_created.append({
                     'transformation_id': next_transformation_id,
@@ -872,6 +1100,17 @@ FROM silver.{source_table};"""
                 
                 next_transformation_id += 1
             
+            if skipped:
+                logger.info(f"Skipped {skipped} recommendations without final_name")
+            # Store all transformation statements using the new framework
+            if pending and not storage.store_transformations_bulk(pending):
+                logger.error(f"Failed to store {len(pending)} stage3 transformation statements")
+                return {
+                    "status": "error",
+                    "message": "Failed to store stage3 transformations",
+                    "transformations_created": 0
+                }
+            
             logger.info(f"Generated {len(transformations_created)} stage3 transformations using new framework")
             
             return {
@@ -889,6 +1128,35 @@ FROM silver.{source_table};"""
                 "transformations_created": 0
             }
     
+    # Gold schema ERD analysis shared across instances, stored as (freshness_token, erd_metadata)
+    _gold_erd_cache = None
+    
+    def _gold_erd_freshness_token(self) -> Optional[tuple]:
+        """
+        Get a cheap token that changes when the gold tables or the recommendations change.
+        
+        Returns:
+            Tuple of dimensional_model and gold part statistics, or None if it cannot be determined
+        """
+        try:
+            token_query = """
+            SELECT
+                (SELECT max(created_at) FROM metadata.dimensional_model) AS model_ts,
+                (SELECT count() FROM metadata.dimensional_model) AS model_rows,
+                (SELECT max(modification_time) FROM system.parts
+                 WHERE database = 'gold' AND active AND table NOT LIKE '%_k') AS gold_parts_ts,
+                (SELECT count() FROM system.parts
+                 WHERE database = 'gold' AND active AND table NOT LIKE '%_k') AS gold_parts
+            """
+            
+            result = self.db_manager.execute_query_dict(token_query)
+            if not result:
+                return None
+            return tuple(result[0].values())
+        except Exception as e:
+            logger.debug(f"Could not determine gold ERD freshness token: {e}")
+            return None
+    
     def generate_stage4_k_table_transformations(self) -> Dict[str, Any]:
         """
         Generate stage4 transformation SQL for K-Table (One Big Table) denormalized structure.
@@ -912,21 +1180,31 @@ FROM silver.{source_table};"""
             logger.info("Generating stage4 K-Table transformations using new framework...")
             
             # First, analyze gold schema ERD to get proper join relationships
-            logger.info("Analyzing gold schema ERD relationships...")
-            erd_analyzer = ERDAnalyzer()
-            
-            # Generate ERD metadata for gold schema (excluding _k tables)
-            gold_erd_metadata = erd_analyzer.generate_erd_metadata(
-                confidence_threshold=0.7,
-                schema_name='gold',
-                table_pattern=None,  # Include all tables
-                exclude_pattern='%_k'  # Exclude K-Table denormalized tables
-            )
-            
-            # Store gold ERD metadata (preserving silver schema data)
-            if gold_erd_metadata['total_tables'] > 0:
-                store_success = erd_analyzer.store_erd_metadata(gold_erd_metadata, preserve_existing=True)
-                logger.info(f"Stored ERD metadata for {gold_erd_metadata['total_tables']} gold schema tables")
+            # (reused while the gold tables and recommendations are unchanged)
+            erd_token = self._gold_erd_freshness_token()
+            cached = DimensionalModelRecommender._gold_erd_cache
+            if erd_token is not None and cached is not None and cached[0] == erd_token:
+                logger.info("Using cached gold schema ERD relationships")
+                gold_erd_metadata = cached[1]
+            else:
+                logger.info("Analyzing gold schema ERD relationships...")
+                erd_analyzer = ERDAnalyzer()
+                
+                # Generate ERD metadata for gold schema (excluding _k tables)
+                gold_erd_metadata = erd_analyzer.generate_erd_metadata(
+                    confidence_threshold=0.7,
+                    schema_name='gold',
+                    table_pattern=None,  # Include all tables
+                    exclude_pattern='%_k'  # Exclude K-Table denormalized tables
+                )
+                
+                # Store gold ERD metadata (preserving silver schema data)
+                if gold_erd_metadata['total_tables'] > 0:
+                    store_success = erd_analyzer.store_erd_metadata(gold_erd_metadata, preserve_existing=True)
+                    logger.info(f"Stored ERD metadata for {gold_erd_metadata['total_tables']} gold schema tables")
+                
+                if erd_token is not None:
+                    DimensionalModelRecommender._gold_erd_cache = (erd_token, gold_erd_metadata)
             
             # Build relationship lookup map from ERD
             erd_relationships_map = {}  # Map of (fact_table, dimension_table) -> (fact_col, dim_col)
@@ -957,15 +1235,6 @@ FROM silver.{source_table};"""
             ORDER BY recommended_name
             """
             
-            fact_tables = self.db_manager.execute_query_dict(fact_query)
-            
-            if not fact_tables:
-                return {
-                    "status": "error",
-                    "message": "No fact tables found. Generate dimensional model recommendations first.",
-                    "transformations_created": 0
-                }
-            
             # Get all dimension tables for lookups
             dim_query = """
             SELECT 
@@ -980,11 +1249,37 @@ FROM silver.{source_table};"""
             ORDER BY recommended_name
             """
             
-            dimension_tables = self.db_manager.execute_query_dict(dim_query)
+            # Get next transformation_id from transformation4 table
+            max_id_query = """
+            SELECT COALESCE(MAX(transformation_id), 0) as max_id
+            FROM metadata.transformation4
+            """
+            
+            # The three metadata reads are independent; run them concurrently on the
+            # shared DatabaseManager workers
+            executor = self.db_manager.get_worker_executor()
+            fact_future = executor.submit(self.db_manager.execute_query_dict, fact_query)
+            dim_future = executor.submit(self.db_manager.execute_query_dict, dim_query)
+            max_id_future = executor.submit(self.db_manager.execute_query_dict, max_id_query)
+            fact_tables = fact_future.result()
+            dimension_tables = dim_future.result()
+            max_id_result = max_id_future.result()
+            
+            if not fact_tables:
+                return {
+                    "status": "error",
+                    "message": "No fact tables found. Generate dimensional model recommendations first.",
+                    "transformations_created": 0
+                }
+            
             # Create lookup maps
             dim_by_key = {}  # Map dimension key column name to dimension table
             dim_by_name = {dim['final_name']: dim for dim in dimension_tables}
             
+            # Strip the _dim suffix from each dimension name once; reused for key lookups below
+            for dim in dimension_tables:
+                dim['_name_base'] = (dim.get('final_name') or dim['recommended_name']).replace('_dim', '')
+            
             # Build mapping of dimension key columns to dimension tables
             # This assumes dimension keys in fact tables match the primary key column name in dimensions
             for dim in dimension_tables:
@@ -993,7 +1288,7 @@ FROM silver.{source_table};"""
                     dim_by_key[root_col] = dim
                 # Also check if final_name suggests a key column
                 # e.g., geography_dim might have geography_key or geography_id
-                dim_name_base = dim['final_name'].replace('_dim', '')
+                dim_name_base = dim['_name_base']
                 possible_keys = [
                     f"{dim_name_base}_key",
                     f"{dim_name_base}_id",
@@ -1004,25 +1299,47 @@ FROM silver.{source_table};"""
                     if key and key not in dim_by_key:
                         dim_by_key[key] = dim
             
-            # Get next transformation_id from transformation4 table
-            max_id_query = """
-            SELECT COALESCE(MAX(transformation_id), 0) as max_id
-            FROM metadata.transformation4
-            """
-            max_id_result = self.db_manager.execute_query_dict(max_id_query)
+            # Load columns of every gold fact/dimension table in one system.columns query
+            gold_tables = {fact.get('final_name') or fact['recommended_name'] for fact in fact_tables}
+            gold_tables.update(dim.get('final_name') or dim['recommended_name'] for dim in dimension_tables)
+            gold_columns = self._load_all_column_structures(sorted(gold_tables), schema_name='gold')
+            
+            # Precompute each dimension's fallback join-key index once:
+            # (primary key, exact-match names, lower-cased <base>_key/<base>_id, name base for prefix match)
+            dim_join_keys = {}
+            for dim in dimension_tables:
+                dim_final_name = dim.get('final_name') or dim['recommended_name']
+                dim_cols = gold_columns.get(dim_final_name)
+                if not dim_cols:
+                    continue
+                dim_root = dim.get('root_column', '')
+                # Primary key: root_column if present in the gold table, otherwise first column
+                dim_pk = next((col['column_name'] for col in dim_cols if col['column_name'] == dim_root), None)
+                if not dim_pk:
+                    dim_pk = dim_cols[0]['column_name']
+                dim_name_base = dim['_name_base'].replace('_key', '').replace('_id', '')
+                dim_join_keys[dim_final_name] = (
+                    dim_pk,
+                    {key for key in (dim_pk, dim_root) if key},
+                    {f"{dim_name_base}_key", f"{dim_name_base}_id"},
+                    dim_name_base
+                )
+            
             next_transformation_id = (max_id_result[0]['max_id'] if max_id_result and max_id_result[0].get('max_id') else 0) + 1
             
             # Initialize storage for new framework
             storage = TransformationStorage(self.db_manager)
             
             transformations_created = []
+            pending = []
+            skipped = 0
             
             for fact_rec in fact_tables:
                 fact_final_name = fact_rec.get('final_name') or fact_rec['recommended_name']
                 
                 # Skip if final_name not set or same as recommended_name
                 if not fact_final_name or fact_final_name == fact_rec['recommended_name']:
-                    logger.warning(f"Skipping {fact_rec['recommended_name']} - final_name not set or same as recommended_name")
+                    skipped += 1
                     continue
                 
                 # Generate K-Table name (replace _fact with _k)
@@ -1030,49 +1347,43 @@ FROM silver.{source_table};"""
                 if not k_table_name.endswith('_k'):
                     k_table_name = f"{k_table_name}_k"
                 
-                # Get ALL columns directly from gold schema fact table
-                try:
-                    fact_cols_query = f"""
-                    SELECT 
-                        name as column_name,
-                        type as data_type
-                    FROM system.columns
-                    WHERE database = 'gold'
-                        AND table = '{fact_final_name}'
-                    ORDER BY position
-                    """
-                    fact_cols_result = self.db_manager.execute_query_dict(fact_cols_query)
-                    if not fact_cols_result:
-                        logger.warning(f"Could not find columns in gold fact table {fact_final_name}")
-                        continue
-                    
-                    # Get all fact columns and types
-                    fact_column_types = {col['column_name']: col['data_type'] for col in fact_cols_result}
-                    fact_cols_to_include = [col['column_name'] for col in fact_cols_result]
-                    
-                    logger.info(f"Found {len(fact_cols_to_include)} columns in fact table {fact_final_name}")
-                    
-                except Exception as e:
-                    logger.error(f"Could not get columns from gold fact table {fact_final_name}: {e}")
+                if not (_IDENTIFIER_RE.match(fact_final_name) and _IDENTIFIER_RE.match(k_table_name)):
+                    logger.warning(f"Skipping {fact_rec['recommended_name']} - invalid table name '{fact_final_name}'")
                     continue
                 
+                # Get ALL columns of the gold schema fact table
+                fact_cols_result = gold_columns.get(fact_final_name)
+                if not fact_cols_result:
+                    logger.warning(f"Could not find columns in gold fact table {fact_final_name}")
+                    continue
+                
+                # Get all fact columns and types
+                fact_column_types = {col['column_name']: col['data_type'] for col in fact_cols_result}
+                fact_cols_to_include = [col['column_name'] for col in fact_cols_result]
+                fact_cols_lower = [(col, col.lower()) for col in fact_cols_to_include]
+                
+                logger.info(f"Found {len(fact_cols_to_include)} columns in fact table {fact_final_name}")
+                
                 # Get dimension_keys from fact_rec for join matching
                 dimension_keys = fact_rec.get('dimension_keys', [])
                 
                 # Find related dimension tables using ERD relationships map first
                 related_dimensions = []
+                seen_dim_ids = set()  # id() of dims already in related_dimensions
                 
                 # First, try to find dimensions via ERD relationships map
                 for dim in dimension_tables:
                     dim_final_name = dim.get('final_name') or dim['recommended_name']
                     # Check if there's an ERD relationship between fact and this dimension
                     if (fact_final_name, dim_final_name) in erd_relationships_map:
-                        if dim not in related_dimensions:
+                        if id(dim) not in seen_dim_ids:
+                            seen_dim_ids.add(id(dim))
                             related_dimensions.append(dim)
                             logger.info(f"Found dimension {dim_final_name} via ERD relationship map")
                     # Also check reverse direction
                     elif (dim_final_name, fact_final_name) in erd_relationships_map:
-                        if dim not in related_dimensions:
+                        if id(dim) not in seen_dim_ids:
+                            seen_dim_ids.add(id(dim))
                             related_dimensions.append(dim)
                             logger.info(f"Found dimension {dim_final_name} via ERD relationship map (reverse)")
                 
@@ -1081,7 +1392,8 @@ FROM silver.{source_table};"""
                     for dim_key in dimension_keys:
                         if dim_key in dim_by_key:
                             dim = dim_by_key[dim_key]
-                            if dim not in related_dimensions:
+                            if id(dim) not in seen_dim_ids:
+                                seen_dim_ids.add(id(dim))
                                 related_dimensions.append(dim)
                                 logger.info(f"Found dimension {dim.get('final_name')} via dimension_key {dim_key}")
                 
@@ -1105,35 +1417,25 @@ FROM silver.{source_table};"""
                 for dim in related_dimensions:
                     dim_final_name = dim.get('final_name') or dim['recommended_name']
                     
-                    # Get ALL columns directly from gold schema dimension table
-                    try:
-                        dim_cols_query = f"""
-                        SELECT 
-                            name as column_name,
-                            type as data_type
-                        FROM system.columns
-                        WHERE database = 'gold'
-                            AND table = '{dim_final_name}'
-                        ORDER BY position
-                        """
-                        dim_cols_result = self.db_manager.execute_query_dict(dim_cols_query)
-                        if not dim_cols_result:
-                            logger.warning(f"Could not find columns in gold dimension table {dim_final_name}")
-                            continue
-                        
-                        # Store all dimension columns and types
-                        for col in dim_cols_result:
-                            col_name = col['column_name']
-                            full_col_name = f"{dim_final_name}.{col_name}"
-                            dim_column_types[full_col_name] = col['data_type']
-                            dim_columns.append((dim_final_name, col_name))
-                        
-                        logger.info(f"Found {len(dim_cols_result)} columns in dimension table {dim_final_name}")
-                        
-                    except Exception as e:
-                        logger.warning(f"Could not get columns from gold dimension table {dim_final_name}: {e}")
+                    if not _IDENTIFIER_RE.match(dim_final_name):
+                        logger.warning(f"Skipping dimension with invalid table name '{dim_final_name}'")
+                        continue
+                    
+                    # Get ALL columns of the gold schema dimension table
+                    dim_cols_result = gold_columns.get(dim_final_name)
+                    if not dim_cols_result:
+                        logger.warning(f"Could not find columns in gold dimension table {dim_final_name}")
                         continue
                     
+                    # Store all dimension columns and types
+                    for col in dim_cols_result:
+                        col_name = col['column_name']
+                        full_col_name = f"{dim_final_name}.{col_name}"
+                        dim_column_types[full_col_name] = col['data_type']
+                        dim_columns.append((dim_final_name, col_name))
+                    
+                    logger.info(f"Found {len(dim_cols_result)} columns in dimension table {dim_final_name}")
+                    
                     # Find the join key using ERD relationships map first
                     join_key = None
                     dim_pk = None
@@ -1150,19 +1452,11 @@ FROM silver.{source_table};"""
                         dim_pk = dim_col
                         logger.info(f"Using ERD relationship (reverse): fact.{join_key} = {dim_final_name}.{dim_pk}")
                     else:
-                        # Fallback: get the dimension's primary key (root_column or first column)
+                        # Fallback: dimension's primary key (root_column or first column)
+                        # and its name-based key forms, precomputed above
                         dim_root = dim.get('root_column', '')
-                        
-                        # Get actual primary key from dimension table structure
-                        if dim_cols_result:
-                            # Try to find root_column in actual columns
-                            for col in dim_cols_result:
-                                if col['column_name'] == dim_root:
-                                    dim_pk = col['column_name']
-                                    break
-                            # Fallback to first column
-                            if not dim_pk:
-                                dim_pk = dim_cols_result[0]['column_name']
+                        if dim_final_name in dim_join_keys:
+                            dim_pk, exact_keys, lower_keys, dim_name_base = dim_join_keys[dim_final_name]
                         
                         if not dim_pk:
                             logger.warning(f"Could not determine primary key for dimension {dim_final_name}")
@@ -1170,13 +1464,9 @@ FROM silver.{source_table};"""
                         
                         # Now find matching dimension key in fact table
                         # Try to match by name (e.g., geography_key matches geography_dim's primary key)
-                        dim_name_base = dim_final_name.replace('_dim', '').replace('_key', '').replace('_id', '')
-                        for fact_col in fact_cols_to_include:
-                            fact_col_lower = fact_col.lower()
-                            if (fact_col == dim_pk or 
-                                fact_col == dim_root or
-                                fact_col_lower == f"{dim_name_base}_key" or
-                                fact_col_lower == f"{dim_name_base}_id" or
+                        for fact_col, fact_col_lower in fact_cols_lower:
+                            if (fact_col in exact_keys or
+                                fact_col_lower in lower_keys or
                                 fact_col_lower.startswith(dim_name_base)):
                                 join_key = fact_col
                                 break
@@ -1234,8 +1524,22 @@ FROM silver.{source_table};"""
                 
                 statements = []
                 
+                # Order by first fact column
+                order_by_col = fact_cols_to_include[0] if fact_cols_to_include else k_table_column_names[0]
+                
+                # Values shared by the K-Table SQL templates
+                sql_params = {
+                    'name': k_table_name,
+                    'fact': fact_final_name,
+                    'defs': ', '.join(all_column_defs),
+                    'order_by': order_by_col,
+                    'cols': ', '.join(k_table_column_names),
+                    'select': ', '.join(select_columns),
+                    'joins': ' '.join(join_clauses)
+                }
+                
                 # Statement 1: DROP TABLE IF EXISTS
-                drop_sql = f"DROP TABLE IF EXISTS gold.{k_table_name};"
+                drop_sql = _STAGE4_DROP_TMPL.format_map(sql_params)
                 statements.append({
                     'execution_sequence': 1,
                     'sql_statement': drop_sql,
@@ -1243,12 +1547,7 @@ FROM silver.{source_table};"""
                 })
                 
                 # Statement 2: CREATE TABLE
-                # Order by first fact column
-                order_by_col = fact_cols_to_include[0] if fact_cols_to_include else k_table_column_names[0]
-                create_sql = f"""CREATE TABLE gold.{k_table_name} (
-    {', '.join(all_column_defs)}
-) ENGINE = MergeTree()
-ORDER BY ({order_by_col});"""
+                create_sql = _STAGE4_CREATE_TMPL.format_map(sql_params)
                 
                 statements.append({
                     'execution_sequence': 2,
@@ -1256,15 +1555,8 @@ ORDER BY ({order_by_col});"""
                     'statement_type': 'CREATE'
                 })
                 
-                # Statement 3: INSERT INTO ... SELECT with JOINs
-                # Build JOIN clauses
-                joins_sql = ' '.join(join_clauses) if join_clauses else ''
-                
-                # Build INSERT statement with explicit column list
-                insert_sql = f"""INSERT INTO gold.{k_table_name} ({', '.join(k_table_column_names)})
-SELECT {', '.join(select_columns)}
-FROM gold.{fact_final_name} AS fact
-{joins_sql};"""
+                # Statement 3: INSERT INTO ... SELECT with JOINs (explicit column list)
+                insert_sql = _STAGE4_INSERT_TMPL.format_map(sql_params)
                 
                 statements.append({
                     'execution_sequence': 3,
@@ -1272,13 +1564,39 @@ FROM gold.{fact_final_name} AS fact
                     'statement_type': 'INSERT'
                 })
                 
-                # Statement 4: OPTIMIZE TABLE
-                optimize_sql = f"OPTIMIZE TABLE gold.{k_table_name} FINAL;"
-                statements.append({
-                    'execution_sequence': 4,
-                    'sql_statement': optimize_sql,
-                    'statement_type': 'OPTIMIZE'
-                })
+                # Statement 4: OPTIMIZE TABLE (opt-in via model_settings.emit_optimize_final)
+                if self.emit_optimize_final:
+                    optimize_sql = _STAGE4_OPTIMIZE_TMPL.format_map(sql_params)
+                    statements.append({
+                        'execution_sequence': 4,
+                        'sql_statement': optimize_sql,
+                        'statement_type': 'OPTIMIZE'
+                    })
+                
+                # Metadata is identical for every statement of this K-Table; build it once
+                related_dim_names = [dim.get('final_name') or dim['recommended_name'] for dim in related_dimensions]
+                fact_table_ref = f'gold.{fact_final_name}'
+                custom_metadata = {
+                    'source_table': fact_table_ref,
+                    'target_table': f'gold.{k_table_name}',
+                    'generated_from': 'k_table_generator',
+                    'transformation_schema_name': 'metadata',
+                    'dependencies': [fact_table_ref] + [f"gold.{name}" for name in related_dim_names],
+                    'execution_frequency': 'daily',
+                    'table_type': 'k_table',
+                    'fact_table': fact_final_name,
+                    'related_dimensions': related_dim_names,
+                    'source_schema': 'gold',
+                    'target_schema': 'gold',
+                    'column_mappings': {
+                        'fact_columns': fact_cols_to_include,
+                        # Prefixed dimension columns follow the fact columns in the K-Table
+                        'dimension_columns': k_table_column_names[len(fact_cols_to_include):],
+                        'total_columns': len(k_table_column_names),
+                        'fact_column_count': len(fact_cols_to_include),
+                        'dimension_column_count': len(dim_columns)
+                    }
+                }
                 
                 # Convert each statement to the new framework and store
                 for statement in statements:
@@ -1289,47 +1607,34 @@ FROM gold.{fact_final_name} AS fact
                         transformation_id=next_transformation_id,
                         transformation_name=transformation_name,
                         execution_sequence=statement['execution_sequence'],
-                        custom_metadata={
-                            'source_table': f'gold.{fact_final_name}',
-                            'target_table': f'gold.{k_table_name}',
-                            'generated_from': 'k_table_generator',
-                            'transformation_schema_name': 'metadata',
-                            'dependencies': [f'gold.{fact_final_name}'] + [f"gold.{dim.get('final_name', dim['recommended_name'])}" for dim in related_dimensions],
-                            'execution_frequency': 'daily',
-                            'table_type': 'k_table',
-                            'fact_table': fact_final_name,
-                            'related_dimensions': [dim.get('final_name', dim['recommended_name']) for dim in related_dimensions],
-                            'source_schema': 'gold',
-                            'target_schema': 'gold',
-                            'column_mappings': {
-                                'fact_columns': fact_cols_to_include,
-                                'dimension_columns': [f"{dim_name}_{col_name}" for dim_name, col_name in dim_columns],
-                                'total_columns': len(k_table_column_names),
-                                'fact_column_count': len(fact_cols_to_include),
-                                'dimension_column_count': len(dim_columns)
-                            }
-                        }
+                        custom_metadata=custom_metadata
                     )
                     
-                    # Create transformation object
-                    transformation = SQLTransformation(transformation_data)
-                    
-                    # Store using the new framework
-                    success = storage.store_transformation(transformation)
-                    if not success:
-                        logger.error(f"Failed to store transformation {next_transformation_id}")
+                    # Create transformation object; stored in one batch after the loop
+                    pending.append(SQLTransformation(transformation_data))
                 
                 transformations_created.append({
                     'transformation_id': next_transformation_id,
                     'transformation_name': transformation_name,
                     'k_table_name': k_table_name,
                     'fact_table': fact_final_name,
-                    'related_dimensions': [dim.get('final_name', dim['recommended_name']) for dim in related_dimensions],
+                    'related_dimensions': related_dim_names,
                     'statements_created': len(statements)
                 })
                 
                 next_transformation_id += 1
             
+            if skipped:
+                logger.info(f"Skipped {skipped} fact recommendations without final_name")
+            # Store all transformation statements using the new framework
+            if pending and not storage.store_transformations_bulk(pending):
+                logger.error(f"Failed to store {len(pending)} stage4 transformation statements")
+                return {
+                    "status": "error",
+                    "message": "Failed to store stage4 K-Table transformations",
+                    "transformations_created": 0
+                }
+            
             logger.info(f"Generated {len(transformations_created)} stage4 K-Table transformations using new framework")
             
             return {
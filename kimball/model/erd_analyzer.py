@@ -10,8 +10,12 @@ Based on the archive kimball_primary_key_analyzer.py with enhancements for Stage
 """
 
 from typing import Dict, List, Any, Tuple, Optional
-from collections import defaultdict
+from collections import defaultdict, deque
+from functools import lru_cache
+from itertools import combinations
+import json
 import logging
+import zlib
 from datetime import datetime
 
 from ..core.database import DatabaseManager
@@ -19,6 +23,58 @@ from ..core.config import Config
 
 logger = logging.getLogger(__name__)
 
+# Columns written by store_erd_metadata (created_at takes its default)
+_ERD_INSERT_COLUMNS = (
+    'id', 'schema_name', 'analysis_timestamp', 'table_name', 'table_type',
+    'row_count', 'column_count', 'primary_key_candidates', 'fact_columns',
+    'dimension_columns', 'relationships', 'metadata_json'
+)
+
+def _column_groups(columns: List[Dict[str, Any]]) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Split analyzed columns into primary key candidates, fact columns and dimension columns in one pass.
+    
+    Args:
+        columns (List[Dict[str, Any]]): Column analysis results for one table
+        
+    Returns:
+        Tuple[List[str], List[str], List[str]]: Column names of PK candidates, facts and dimensions
+    """
+    pk_candidates, fact_columns, dimension_columns = [], [], []
+    for col in columns:
+        column_name = col['column_name']
+        if col['is_primary_key_candidate']:
+            pk_candidates.append(column_name)
+        classification = col['classification']
+        if classification == 'fact':
+            fact_columns.append(column_name)
+        elif classification == 'dimension':
+            dimension_columns.append(column_name)
+    return pk_candidates, fact_columns, dimension_columns
+
+
+# Substring tokens used by the primary key and fact/dimension heuristics
+_PK_NAME_INDICATORS = ('id', 'key', 'code', 'num', 'no')
+_PK_PREFERRED_TYPES = ('string', 'int', 'uint')
+_NUMERIC_TYPE_TOKENS = ('float', 'int', 'uint', 'decimal')
+
+# Fact column types that are measures rather than join keys
+_NON_JOIN_FACT_TYPE_TOKENS = ('float', 'decimal')
+
+_NUMERIC_JOIN_TYPES = frozenset((
+    'int8', 'int16', 'int32', 'int64', 'uint8', 'uint16', 'uint32', 'uint64', 'float32', 'float64'
+))
+
+# Columns whose approximate cardinality is within this fraction of the row count
+# (and have no nulls) get an exact distinct count to confirm primary key candidacy
+PK_EXACT_CHECK_TOLERANCE = 0.01
+
+# Maximum number of columns aggregated by one ERD column stats query
+STATS_COLUMNS_PER_QUERY = 50
+
+# Maximum number of candidate column pairs whose value overlap is computed by one query
+OVERLAP_PAIRS_PER_QUERY = 500
+
 
 class ERDAnalyzer:
     """
@@ -30,6 +86,10 @@ class ERDAnalyzer:
     - Join relationships between tables
     - Fact vs dimension table identification
     - ERD metadata for dimensional modeling
+    
+    Column cardinalities are uniq() (HyperLogLog) estimates, which is enough for the
+    threshold-based classification and scoring. Primary key candidacy needs an exact
+    count, so near-unique columns are re-checked with uniqExact.
     """
     
     def __init__(self):
@@ -39,12 +99,137 @@ class ERDAnalyzer:
         self.stage1_tables = []
         self.table_metadata = {}
         self.erd_relationships = []
+        self.high_confidence_count = 0  # relationships above 0.7 confidence from the last search
         
         # Load ignore fields configuration
         config_data = self.config.get_config()
-        self.ignore_join_fields = config_data.get('model_settings', {}).get('ignore_join_fields', [])
-        logger.info(f"Loaded ignore join fields: {self.ignore_join_fields}")
+        model_settings = config_data.get('model_settings', {})
+        # Lower-cased set so the per-column check in find_join_relationships is one hash lookup
+        self.ignore_join_fields = frozenset(
+            field.lower() for field in model_settings.get('ignore_join_fields', [])
+        )
+        logger.info(f"Loaded ignore join fields: {sorted(self.ignore_join_fields)}")
+        
+        # Number of tables analyzed concurrently by generate_erd_metadata
+        # (bounded by the shared DatabaseManager worker pool)
+        self.erd_parallelism = max(1, int(model_settings.get('erd_parallelism', 8)))
+        
+    # Discovered tables and column structures shared across instances (routes create
+    # one per request), keyed by (schema, table_pattern, exclude_pattern) and stored
+    # as (freshness_token, tables, columns_by_table)
+    _schema_cache = {}
+    
+    # Row count and column stats per table, keyed by (schema, table) and stored as
+    # (data_freshness_token, column_names, row_count, column_stats)
+    _stats_cache = {}
+    
+    @classmethod
+    def invalidate_cache(cls):
+        """Drop cached table discovery, column structures and column stats, e.g. after schema changes."""
+        cls._schema_cache = {}
+        cls._stats_cache = {}
+    
+    def _schema_freshness_token(self, schema_name: str) -> Optional[tuple]:
+        """
+        Get a cheap token that changes whenever tables in the schema are created, dropped or altered.
+        
+        Args:
+            schema_name (str): Schema/database name
+            
+        Returns:
+            Optional[tuple]: Latest metadata modification time and table count, or None if unavailable
+        """
+        try:
+            token_query = """
+            SELECT 
+                max(metadata_modification_time) as last_modified,
+                count() as table_count
+            FROM system.tables 
+            WHERE database = {schema_name:String}
+            """
+            
+            result = self.db_manager.execute_query_dict(token_query, parameters={'schema_name': schema_name})
+            if not result:
+                return None
+            return (result[0]['last_modified'], result[0]['table_count'])
+        except Exception as e:
+            logger.debug(f"Could not determine schema freshness token for {schema_name}: {e}")
+            return None
+    
+    def _data_freshness_tokens(self, tables: List[str], schema_name: str = 'silver') -> Dict[str, tuple]:
+        """
+        Get tokens that change whenever data in the given tables is inserted, mutated or dropped.
+        
+        Args:
+            tables (List[str]): Table names
+            schema_name (str): Schema/database name (default: 'silver')
+            
+        Returns:
+            Dict[str, tuple]: Table name to (latest active part modification time, row count,
+            active part count); tables without parts (non-MergeTree) are omitted
+        """
+        if not tables:
+            return {}
+        
+        try:
+            token_query = """
+            SELECT 
+                table,
+                max(modification_time) as last_modified,
+                sum(rows) as total_rows,
+                count() as part_count
+            FROM system.parts 
+            WHERE database = {schema_name:String}
+            AND table IN {tables:Array(String)}
+            AND active
+            GROUP BY table
+            """
+            
+            result = self.db_manager.execute_query_dict(
+                token_query,
+                parameters={'schema_name': schema_name, 'tables': list(tables)}
+            )
+            return {
+                row['table']: (row['last_modified'], row['total_rows'], row['part_count'])
+                for row in result or []
+            }
+        except Exception as e:
+            logger.debug(f"Could not determine data freshness tokens for schema {schema_name}: {e}")
+            return {}
+    
+    def _discover_schema(self, schema_name: str, table_pattern: Optional[str] = None,
+                         exclude_pattern: Optional[str] = None) -> Tuple[List[str], Dict[str, List[Dict[str, Any]]]]:
+        """
+        Discover tables and load their column structures, reusing the cached result while the schema is unchanged.
         
+        Args:
+            schema_name (str): Schema/database name
+            table_pattern (Optional[str]): SQL LIKE pattern for table names (ignored for silver)
+            exclude_pattern (Optional[str]): SQL LIKE pattern to exclude (ignored for silver)
+            
+        Returns:
+            Tuple[List[str], Dict[str, List[Dict[str, Any]]]]: Table names and columns per table
+        """
+        cache_key = (schema_name, table_pattern, exclude_pattern)
+        token = self._schema_freshness_token(schema_name)
+        cached = ERDAnalyzer._schema_cache.get(cache_key)
+        if token is not None and cached and cached[0] == token:
+            logger.info(f"Using cached table discovery for schema {schema_name}")
+            return cached[1], cached[2]
+        
+        if schema_name == 'silver':
+            tables = self.discover_stage1_tables()
+        else:
+            tables = self.discover_tables_for_schema(schema_name, table_pattern, exclude_pattern)
+        
+        # Column structures for every table come from one system.columns query
+        columns_by_table = self._load_all_columns(tables, schema_name)
+        
+        if token is not None and tables:
+            ERDAnalyzer._schema_cache[cache_key] = (token, tables, columns_by_table)
+        
+        return tables, columns_by_table
+    
     def discover_stage1_tables(self) -> List[str]:
         """
         Discover all Stage 1 tables in the silver schema.
@@ -67,21 +252,24 @@ class ERDAnalyzer:
             List[str]: List of table names
         """
         try:
-            query = f"""
+            query = """
             SELECT name 
             FROM system.tables 
-            WHERE database = '{schema_name}'
+            WHERE database = {schema_name:String}
             """
+            parameters = {'schema_name': schema_name}
             
             if table_pattern:
-                query += f" AND name LIKE '{table_pattern}'"
+                query += " AND name LIKE {table_pattern:String}"
+                parameters['table_pattern'] = table_pattern
             
             if exclude_pattern:
-                query += f" AND name NOT LIKE '{exclude_pattern}'"
+                query += " AND name NOT LIKE {exclude_pattern:String}"
+                parameters['exclude_pattern'] = exclude_pattern
             
             query += " ORDER BY name"
             
-            results = self.db_manager.execute_query_dict(query)
+            results = self.db_manager.execute_query_dict(query, parameters=parameters)
             tables = [row['name'] for row in results] if results else []
             
             logger.info(f"Discovered {len(tables)} tables in schema {schema_name}")
@@ -91,21 +279,25 @@ class ERDAnalyzer:
             logger.error(f"Error discovering tables in schema {schema_name}: {e}")
             return []
     
-    def analyze_table_metadata(self, table_name: str, schema_name: str = 'silver') -> Dict[str, Any]:
+    def _load_all_columns(self, tables: List[str], schema_name: str = 'silver') -> Dict[str, List[Dict[str, Any]]]:
         """
-        Analyze metadata for a single table in the specified schema.
+        Load column structures for several tables with a single system.columns query.
         
         Args:
-            table_name (str): Name of the table
+            tables (List[str]): Table names to load
             schema_name (str): Schema/database name (default: 'silver')
             
         Returns:
-            Dict[str, Any]: Table metadata including columns and relationships
+            Dict[str, List[Dict[str, Any]]]: Table name to its columns in position order
         """
+        columns_by_table = defaultdict(list)
+        if not tables:
+            return columns_by_table
+        
         try:
-            # Get table structure
-            structure_query = f"""
+            structure_query = """
             SELECT 
+                table,
                 name as column_name,
                 type as data_type,
                 default_kind,
@@ -113,22 +305,67 @@ class ERDAnalyzer:
                 is_in_sorting_key,
                 is_in_primary_key
             FROM system.columns 
-            WHERE database = '{schema_name}' 
-            AND table = '{table_name}'
-            ORDER BY position
+            WHERE database = {schema_name:String}
+            AND table IN {tables:Array(String)}
+            ORDER BY table, position
             """
             
-            columns = self.db_manager.execute_query_dict(structure_query)
+            # Stream rows and group them in a single pass; ORDER BY keeps position order
+            results = self.db_manager.execute_query_iter(
+                structure_query,
+                parameters={'schema_name': schema_name, 'tables': list(tables)}
+            )
+            for col in results:
+                columns_by_table[col['table']].append(col)
+        except Exception as e:
+            logger.error(f"Error loading columns for tables in schema {schema_name}: {e}")
+        
+        return columns_by_table
+    
+    def analyze_table_metadata(self, table_name: str, schema_name: str = 'silver',
+                               columns: Optional[List[Dict[str, Any]]] = None,
+                               analysis_timestamp: Optional[str] = None,
+                               freshness_token: Optional[tuple] = None) -> Dict[str, Any]:
+        """
+        Analyze metadata for a single table in the specified schema.
+        
+        Args:
+            table_name (str): Name of the table
+            schema_name (str): Schema/database name (default: 'silver')
+            columns (Optional[List[Dict[str, Any]]]): Pre-loaded system.columns rows;
+                queried for this table when omitted
+            analysis_timestamp (Optional[str]): Timestamp of the enclosing analysis run;
+                the current time when omitted
+            freshness_token (Optional[tuple]): Data freshness token from _data_freshness_tokens;
+                cached column stats are reused while it is unchanged
+            
+        Returns:
+            Dict[str, Any]: Table metadata including columns and relationships
+        """
+        try:
+            # Get table structure
+            if columns is None:
+                columns = self._load_all_columns([table_name], schema_name).get(table_name, [])
             
-            # Get row count
-            count_query = f"SELECT COUNT(*) as row_count FROM {schema_name}.{table_name}"
-            count_result = self.db_manager.execute_query_dict(count_query)
-            row_count = count_result[0]['row_count'] if count_result else 0
+            # Collect the row count plus cardinality, null and sample stats for
+            # every column in one scan, unless the table's data and columns are
+            # unchanged since the cached scan
+            cache_key = (schema_name, table_name)
+            column_names = tuple(col['column_name'] for col in columns)
+            cached = ERDAnalyzer._stats_cache.get(cache_key)
+            if freshness_token is not None and cached and cached[0] == freshness_token and cached[1] == column_names:
+                logger.debug(f"Using cached column stats for {schema_name}.{table_name}")
+                row_count, column_stats = cached[2], cached[3]
+            else:
+                row_count, column_stats = self._fetch_column_stats(table_name, columns, schema_name)
+                # Only complete results are cached so failed columns are retried next run
+                if freshness_token is not None and column_stats and len(column_stats) == len(columns):
+                    ERDAnalyzer._stats_cache[cache_key] = (freshness_token, column_names, row_count, column_stats)
             
             # Analyze each column
             column_analysis = []
             for col in columns:
-                col_analysis = self._analyze_column(table_name, col, schema_name)
+                col_analysis = self._analyze_column(table_name, col, column_stats.get(col['column_name']))
                 column_analysis.append(col_analysis)
             
             # Determine table type (fact vs dimension)
@@ -140,7 +377,7 @@ class ERDAnalyzer:
                 'column_count': len(columns),
                 'table_type': table_type,
                 'columns': column_analysis,
-                'analysis_timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                'analysis_timestamp': analysis_timestamp or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
             
             self.table_metadata[table_name] = metadata
@@ -150,53 +387,153 @@ class ERDAnalyzer:
             logger.error(f"Error analyzing table {table_name} in schema {schema_name}: {e}")
             return {}
     
-    def _analyze_column(self, table_name: str, column_info: Dict[str, Any], schema_name: str = 'silver') -> Dict[str, Any]:
+    def _fetch_column_stats(self, table_name: str, columns: List[Dict[str, Any]],
+                            schema_name: str = 'silver') -> Tuple[int, Dict[str, Dict[str, Any]]]:
         """
-        Analyze a single column for ERD purposes.
+        Collect the row count and per-column statistics for a table with a single aggregate query
+        (one per STATS_COLUMNS_PER_QUERY columns on very wide tables).
         
         Args:
             table_name (str): Name of the table
-            column_info (Dict[str, Any]): Column information from system.columns
+            columns (List[Dict[str, Any]]): Column information from system.columns
             schema_name (str): Schema/database name (default: 'silver')
             
         Returns:
-            Dict[str, Any]: Column analysis results
+            Tuple[int, Dict[str, Dict[str, Any]]]: Row count and a mapping of column name
+            to cardinality, null_count, total_count and sample_values; columns whose stats
+            query failed are left out
         """
-        column_name = column_info['column_name']
-        data_type = column_info['data_type']
+        if not columns:
+            return 0, {}
+        
+        stats = {}
+        total_count = None
         
         try:
-            # Get cardinality and null count
-            cardinality_query = f"""
+            # One scan per chunk of columns (a single scan for most tables) keeps the
+            # SQL text bounded on very wide tables. Columns are addressed by position
+            # in the aliases so any column name is safe. A failed chunk is retried one
+            # column at a time so a single bad column does not take its neighbours down.
+            pending = [
+                columns[start:start + STATS_COLUMNS_PER_QUERY]
+                for start in range(0, len(columns), STATS_COLUMNS_PER_QUERY)
+            ]
+            while pending:
+                chunk = pending.pop(0)
+                row = self._query_column_stats(table_name, chunk, schema_name)
+                if row is None:
+                    if len(chunk) > 1:
+                        pending.extend([col] for col in chunk)
+                    else:
+                        # Keep what the other queries collected; only this column falls back
+                        logger.warning(f"Skipping stats for column {schema_name}.{table_name}.{chunk[0]['column_name']}")
+                    continue
+                
+                total_count = row['total_count']
+                for i, col in enumerate(chunk):
+                    stats[col['column_name']] = {
+                        'cardinality': min(row[f'c_{i}'], total_count),
+                        'null_count': row[f'n_{i}'],
+                        'total_count': total_count,
+                        'sample_values': list(row[f's_{i}'])
+                    }
+            
+            # Every stats query failed; still report the table's real row count
+            if total_count is None:
+                count_result = self.db_manager.execute_query_dict(
+                    "SELECT count() as row_count FROM {schema_name:Identifier}.{table_name:Identifier}",
+                    parameters={'schema_name': schema_name, 'table_name': table_name}
+                )
+                total_count = count_result[0]['row_count'] if count_result else 0
+            
+            # uniq() is approximate; confirm near-unique columns exactly since the
+            # primary key test compares cardinality with the row count. Columns whose
+            # type can never be a key are not worth the exact distinct scan.
+            near_unique = [
+                col['column_name'] for col in columns
+                if col['column_name'] in stats and self._pk_type_suitable(col['data_type'])
+                and stats[col['column_name']]['null_count'] == 0 and total_count > 0
+                and total_count - stats[col['column_name']]['cardinality'] <= total_count * PK_EXACT_CHECK_TOLERANCE
+            ]
+            if near_unique:
+                parameters = {'schema_name': schema_name, 'table_name': table_name}
+                parameters.update((f'col_{i}', name) for i, name in enumerate(near_unique))
+                exact_query = f"""
             SELECT 
-                COUNT(DISTINCT `{column_name}`) as cardinality,
-                COUNT(*) - COUNT(`{column_name}`) as null_count,
-                COUNT(*) as total_count
-            FROM {schema_name}.{table_name}
+                {', '.join(f"uniqExact({{col_{i}:Identifier}}) as e_{i}" for i in range(len(near_unique)))}
+            FROM {{schema_name:Identifier}}.{{table_name:Identifier}}
             """
+                # On failure the approximate cardinalities are kept
+                exact_result = self.db_manager.execute_query_dict(exact_query, parameters=parameters)
+                if exact_result:
+                    for i, name in enumerate(near_unique):
+                        stats[name]['cardinality'] = exact_result[0][f'e_{i}']
             
-            stats = self.db_manager.execute_query_dict(cardinality_query)
-            if stats:
-                cardinality = stats[0]['cardinality']
-                null_count = stats[0]['null_count']
-                total_count = stats[0]['total_count']
-                null_percentage = (null_count / total_count * 100) if total_count > 0 else 0
-            else:
-                cardinality = 0
-                null_count = 0
-                null_percentage = 0
-            
-            # Get sample values
-            sample_query = f"""
-            SELECT DISTINCT `{column_name}` as sample_value
-            FROM {schema_name}.{table_name}
-            WHERE `{column_name}` IS NOT NULL
-            ORDER BY `{column_name}`
-            LIMIT 5
+            return total_count, stats
+        except Exception as e:
+            logger.error(f"Error collecting column stats for {schema_name}.{table_name}: {e}")
+            return total_count or 0, stats
+    
+    def _query_column_stats(self, table_name: str, columns: List[Dict[str, Any]],
+                            schema_name: str = 'silver') -> Optional[Dict[str, Any]]:
+        """
+        Run one aggregate stats query over a group of columns.
+        
+        Args:
+            table_name (str): Name of the table
+            columns (List[Dict[str, Any]]): Columns to aggregate, addressed by position in the aliases
+            schema_name (str): Schema/database name (default: 'silver')
+            
+        Returns:
+            Optional[Dict[str, Any]]: total_count plus c_i (uniq), n_i (null count) and
+            s_i (sample values) for each column position, or None if the query failed
+        """
+        parameters = {'schema_name': schema_name, 'table_name': table_name}
+        select_parts = ['count() as total_count']
+        for i, col in enumerate(columns):
+            parameters[f'col_{i}'] = col['column_name']
+            quoted = f"{{col_{i}:Identifier}}"
+            select_parts.append(f"uniq({quoted}) as c_{i}")
+            select_parts.append(f"count() - count({quoted}) as n_{i}")
+            select_parts.append(f"groupUniqArray(5)({quoted}) as s_{i}")
+        
+        stats_query = f"""
+            SELECT 
+                {', '.join(select_parts)}
+            FROM {{schema_name:Identifier}}.{{table_name:Identifier}}
             """
+        
+        try:
+            result = self.db_manager.execute_query_dict(stats_query, parameters=parameters)
+            return result[0] if result else None
+        except Exception as e:
+            logger.warning(f"Error collecting column stats for {schema_name}.{table_name}: {e}")
+            return None
+    
+    def _analyze_column(self, table_name: str, column_info: Dict[str, Any], stats: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Analyze a single column for ERD purposes.
+        
+        Args:
+            table_name (str): Name of the table
+            column_info (Dict[str, Any]): Column information from system.columns
+            stats (Optional[Dict[str, Any]]): Pre-fetched stats from _fetch_column_stats
             
-            samples = self.db_manager.execute_query_dict(sample_query)
-            sample_values = [row['sample_value'] for row in samples] if samples else []
+        Returns:
+            Dict[str, Any]: Column analysis results
+        """
+        column_name = column_info['column_name']
+        data_type = column_info['data_type']
+        
+        try:
+            if not stats:
+                raise ValueError("no column statistics available")
+            
+            cardinality = stats['cardinality']
+            null_count = stats['null_count']
+            total_count = stats['total_count']
+            null_percentage = (null_count / total_count * 100) if total_count > 0 else 0
+            sample_values = stats['sample_values']
             
             # Determine if it's a primary key candidate
             is_pk_candidate = self._is_primary_key_candidate(
@@ -260,6 +597,10 @@ class ERDAnalyzer:
         Returns:
             bool: True if column is a primary key candidate
         """
+        # Cheapest gate first: the data type must be suitable for a key
+        if not self._pk_type_suitable(data_type):
+            return False
+        
         # Must have no nulls
         if null_count > 0:
             return False
@@ -268,18 +609,26 @@ class ERDAnalyzer:
         if cardinality != total_count:
             return False
         
-        # Prefer certain data types
-        preferred_types = ['string', 'int', 'uint']
-        data_type_lower = data_type.lower()
-        
-        # Check if data type is suitable for primary key
-        type_suitable = any(pref in data_type_lower for pref in preferred_types)
-        
         # Check if column name suggests it's an ID
-        name_suggests_id = any(indicator in column_name.lower() 
-                              for indicator in ['id', 'key', 'code', 'num', 'no'])
+        column_name_lower = column_name.lower()
+        name_suggests_id = any(indicator in column_name_lower for indicator in _PK_NAME_INDICATORS)
         
-        return type_suitable and (name_suggests_id or cardinality > 1000)
+        return name_suggests_id or cardinality > 1000
+    
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _pk_type_suitable(data_type: str) -> bool:
+        """
+        Check whether a column type can hold a primary key (string or integer types).
+        
+        Args:
+            data_type (str): Column data type
+            
+        Returns:
+            bool: True if the type is suitable for a primary key
+        """
+        data_type_lower = data_type.lower()
+        return any(pref in data_type_lower for pref in _PK_PREFERRED_TYPES)
     
     def _classify_column(self, column_name: str, data_type: str, 
                         cardinality: int, null_percentage: float) -> str:
@@ -295,18 +644,35 @@ class ERDAnalyzer:
         Returns:
             str: Column classification ('fact' or 'dimension')
         """
+        is_numeric, is_string = self._classification_type_flags(data_type)
+        
         # Numeric columns are typically facts
-        numeric_types = ['float', 'int', 'uint', 'decimal']
-        if any(num_type in data_type.lower() for num_type in numeric_types):
+        if is_numeric:
             return 'fact'
         
         # High cardinality string columns might be facts (IDs)
-        if cardinality > 10000 and 'string' in data_type.lower():
+        if cardinality > 10000 and is_string:
             return 'fact'
         
         # Everything else is a dimension
         return 'dimension'
     
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _classification_type_flags(data_type: str) -> Tuple[bool, bool]:
+        """
+        Get the type-based inputs to _classify_column, computed once per distinct type string.
+        
+        Args:
+            data_type (str): Column data type
+            
+        Returns:
+            Tuple[bool, bool]: (is numeric, is string)
+        """
+        data_type_lower = data_type.lower()
+        is_numeric = any(num_type in data_type_lower for num_type in _NUMERIC_TYPE_TOKENS)
+        return is_numeric, 'string' in data_type_lower
+    
     def _determine_table_type(self, columns: List[Dict[str, Any]], row_count: int) -> str:
         """
         Determine if a table is a fact table or dimension table.
@@ -378,10 +744,8 @@ class ERDAnalyzer:
         Returns:
             List[Dict[str, Any]]: List of potential join relationships
         """
-        relationships = []
-        
-        # Get distinct values for each column in each table
-        column_distinct_values = {}
+        # Candidate join columns from every analyzed table
+        column_infos = {}
         
         for table_name, metadata in self.table_metadata.items():
             for col in metadata['columns']:
@@ -396,95 +760,201 @@ class ERDAnalyzer:
                 if col['cardinality'] < 2:
                     continue
                 
-                # Get distinct values for this column
-                try:
-                    distinct_query = f"SELECT DISTINCT `{col_name}` as value FROM {schema_name}.{table_name} WHERE `{col_name}` IS NOT NULL"
-                    result = self.db_manager.execute_query_dict(distinct_query)
-                    distinct_values = {str(row['value']) for row in result if row.get('value') is not None}
-                    
-                    if distinct_values:
-                        column_distinct_values[(table_name, col_name)] = {
-                            'values': distinct_values,
-                            'count': len(distinct_values),
-                            'type': col['data_type'],
-                            'cardinality': col['cardinality'],
-                            'is_pk_candidate': col['is_primary_key_candidate'],
-                            'classification': col['classification']
-                        }
-                        logger.debug(f"Got {len(distinct_values)} distinct values for {table_name}.{col_name}")
-                except Exception as e:
-                    logger.warning(f"Error getting distinct values for {table_name}.{col_name}: {e}")
+                # Skip float/decimal measures
+                if not self._is_join_candidate(col):
                     continue
+                
+                column_infos[(table_name, col_name)] = {
+                    'type': col['data_type'],
+                    'cardinality': col['cardinality'],
+                    'is_pk_candidate': col['is_primary_key_candidate'],
+                    'classification': col['classification']
+                }
+        
+        # Candidate pairs: columns from different tables in the same join-compatible
+        # type family, so incompatible pairs are never visited
+        column_keys = list(column_infos.keys())
+        type_buckets = defaultdict(list)
+        for index, key in enumerate(column_keys):
+            type_buckets[self._type_bucket(column_infos[key]['type'])].append(index)
+        
+        candidate_pairs = [
+            (i, j)
+            for bucket_indices in type_buckets.values()
+            for i, j in combinations(bucket_indices, 2)
+            if column_keys[i][0] != column_keys[j][0]
+        ]
+        
+        # Distinct counts and overlaps are computed by ClickHouse as bitmap
+        # cardinalities, so distinct values never travel to Python
+        distinct_counts = {}
+        overlap_counts = {}
+        for start in range(0, len(candidate_pairs), OVERLAP_PAIRS_PER_QUERY):
+            pairs = candidate_pairs[start:start + OVERLAP_PAIRS_PER_QUERY]
+            try:
+                chunk_counts, chunk_overlaps = self._fetch_overlap_counts(pairs, column_keys, schema_name)
+                distinct_counts.update(chunk_counts)
+                overlap_counts.update(chunk_overlaps)
+            except Exception as e:
+                logger.warning(f"Error computing value overlap for {len(pairs)} column pairs: {e}")
+                continue
         
-        # Compare distinct value sets across different tables
-        column_keys = list(column_distinct_values.keys())
+        for index, count in distinct_counts.items():
+            column_infos[column_keys[index]]['count'] = count
         
-        for i, (table1, col1) in enumerate(column_keys):
-            col1_info = column_distinct_values[(table1, col1)]
+        found = []  # ((i, j), relationship) so ties keep the original pair order
+        high_confidence_count = 0
+        
+        for i, j in candidate_pairs:
+            overlap_count = overlap_counts.get((i, j), 0)
+            if overlap_count == 0:
+                continue
             
-            for j, (table2, col2) in enumerate(column_keys[i+1:], i+1):
-                # Only compare columns from different tables
-                if table1 == table2:
-                    continue
-                
-                col2_info = column_distinct_values[(table2, col2)]
-                
-                # Check if types are compatible
-                if not self._are_types_compatible(col1_info['type'], col2_info['type']):
-                    continue
-                
-                # Calculate overlap
-                overlap = col1_info['values'] & col2_info['values']
-                overlap_count = len(overlap)
-                
-                if overlap_count == 0:
-                    continue
-                
-                # Calculate confidence based on overlap
-                # Confidence = (overlap / min(distinct_count1, distinct_count2))
-                min_cardinality = min(col1_info['count'], col2_info['count'])
-                confidence = overlap_count / min_cardinality if min_cardinality > 0 else 0.0
-                
-                # Apply threshold
-                if confidence < confidence_threshold:
-                    continue
-                
-                # Determine relationship type
-                relationship_type = self._determine_relationship_type_data_based(
-                    col1_info, col2_info, overlap_count, col1_info['count'], col2_info['count']
-                )
-                
-                relationship = {
-                    'table1': table1,
-                    'column1': col1,
-                    'table2': table2,
-                    'column2': col2,
-                    'type1': col1_info['type'],
-                    'type2': col2_info['type'],
-                    'cardinality1': col1_info['count'],
-                    'cardinality2': col2_info['count'],
-                    'is_pk1': col1_info['is_pk_candidate'],
-                    'is_pk2': col2_info['is_pk_candidate'],
-                    'classification1': col1_info['classification'],
-                    'classification2': col2_info['classification'],
-                    'overlap_count': overlap_count,
-                    'overlap_percentage': round(confidence * 100, 2),
-                    'join_confidence': round(confidence, 4),
-                    'relationship_type': relationship_type
-                }
-                relationships.append(relationship)
-                
-                logger.debug(f"Found relationship: {table1}.{col1} <-> {table2}.{col2} "
-                           f"(confidence: {confidence:.2%}, overlap: {overlap_count})")
+            table1, col1 = column_keys[i]
+            table2, col2 = column_keys[j]
+            col1_info = column_infos[(table1, col1)]
+            col2_info = column_infos[(table2, col2)]
+            
+            # Calculate confidence based on overlap
+            # Confidence = (overlap / min(distinct_count1, distinct_count2))
+            min_cardinality = min(col1_info['count'], col2_info['count'])
+            confidence = overlap_count / min_cardinality if min_cardinality > 0 else 0.0
+            
+            # Apply threshold
+            if confidence < confidence_threshold:
+                continue
+            
+            # Determine relationship type
+            relationship_type = self._determine_relationship_type_data_based(
+                col1_info, col2_info, overlap_count, col1_info['count'], col2_info['count']
+            )
+            
+            relationship = {
+                'table1': table1,
+                'column1': col1,
+                'table2': table2,
+                'column2': col2,
+                'type1': col1_info['type'],
+                'type2': col2_info['type'],
+                'cardinality1': col1_info['count'],
+                'cardinality2': col2_info['count'],
+                'is_pk1': col1_info['is_pk_candidate'],
+                'is_pk2': col2_info['is_pk_candidate'],
+                'classification1': col1_info['classification'],
+                'classification2': col2_info['classification'],
+                'overlap_count': overlap_count,
+                'overlap_percentage': round(confidence * 100, 2),
+                'join_confidence': round(confidence, 4),
+                'relationship_type': relationship_type
+            }
+            found.append(((i, j), relationship))
+            if relationship['join_confidence'] > 0.7:
+                high_confidence_count += 1
+            
+            logger.debug(f"Found relationship: {table1}.{col1} <-> {table2}.{col2} "
+                       f"(confidence: {confidence:.2%}, overlap: {overlap_count})")
         
         # Sort by join confidence (descending)
-        relationships.sort(key=lambda x: x['join_confidence'], reverse=True)
+        found.sort(key=lambda item: (-item[1]['join_confidence'], item[0]))
+        relationships = [relationship for _, relationship in found]
         self.erd_relationships = relationships
+        self.high_confidence_count = high_confidence_count
         
         logger.info(f"Found {len(relationships)} relationships above {confidence_threshold:.0%} confidence threshold")
         
         return relationships
     
+    def _is_join_candidate(self, col: Dict[str, Any]) -> bool:
+        """
+        Check whether an analyzed column can plausibly take part in a join.
+        
+        Only float/decimal fact columns (measures) are excluded. Unique columns stay:
+        the natural key of a small dimension table is often not a primary key
+        candidate by name, yet it is exactly what facts join to.
+        
+        Args:
+            col (Dict[str, Any]): Column analysis from _analyze_column
+            
+        Returns:
+            bool: True if the column should be compared against other tables
+        """
+        if col['classification'] == 'fact':
+            data_type_lower = col['data_type'].lower()
+            if any(token in data_type_lower for token in _NON_JOIN_FACT_TYPE_TOKENS):
+                return False
+        
+        return True
+    
+    def _fetch_overlap_counts(self, pairs: List[Tuple[int, int]], column_keys: List[Tuple[str, str]],
+                              schema_name: str = 'silver') -> Tuple[Dict[int, int], Dict[Tuple[int, int], int]]:
+        """
+        Compute distinct counts and pairwise value overlaps for candidate join columns in one query.
+        
+        Each referenced column's non-null values are hashed with cityHash64 into a
+        groupBitmap state (one scan per column), and overlaps are bitmap AND cardinalities.
+        
+        Args:
+            pairs (List[Tuple[int, int]]): Candidate pairs as indexes into column_keys
+            column_keys (List[Tuple[str, str]]): (table, column) for every candidate column
+            schema_name (str): Schema/database name (default: 'silver')
+            
+        Returns:
+            Tuple[Dict[int, int], Dict[Tuple[int, int], int]]: Distinct count per column index
+            and overlap count per pair
+        """
+        indices = sorted({index for pair in pairs for index in pair})
+        
+        parameters = {'schema_name': schema_name}
+        with_parts = []
+        for index in indices:
+            table_name, col_name = column_keys[index]
+            parameters[f't_{index}'] = table_name
+            parameters[f'col_{index}'] = col_name
+            with_parts.append(
+                f"(SELECT groupBitmapState(cityHash64(toString({{col_{index}:Identifier}}))) "
+                f"FROM {{schema_name:Identifier}}.{{t_{index}:Identifier}} "
+                f"WHERE {{col_{index}:Identifier}} IS NOT NULL) AS b_{index}"
+            )
+        select_parts = [f"bitmapCardinality(b_{index}) as n_{index}" for index in indices]
+        select_parts.extend(f"bitmapAndCardinality(b_{i}, b_{j}) as o_{i}_{j}" for i, j in pairs)
+        
+        overlap_query = f"""
+            WITH {', '.join(with_parts)}
+            SELECT 
+                {', '.join(select_parts)}
+            """
+        
+        result = self.db_manager.execute_query_dict(overlap_query, parameters=parameters)
+        if not result:
+            raise RuntimeError("overlap query returned no result")
+        
+        row = result[0]
+        distinct_counts = {index: row[f'n_{index}'] for index in indices}
+        overlap_counts = {(i, j): row[f'o_{i}_{j}'] for i, j in pairs}
+        return distinct_counts, overlap_counts
+    
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _type_bucket(data_type: str) -> Tuple[str, ...]:
+        """
+        Map a column type to its join-compatibility family.
+        
+        Two types are compatible for joining exactly when they share a bucket,
+        matching _are_types_compatible.
+        
+        Args:
+            data_type (str): Column type
+            
+        Returns:
+            Tuple[str, ...]: ('numeric',), ('string',) or ('exact', normalized type)
+        """
+        type_norm = data_type.lower().replace('nullable(', '').replace(')', '')
+        if type_norm in _NUMERIC_JOIN_TYPES:
+            return ('numeric',)
+        if 'string' in type_norm:
+            return ('string',)
+        return ('exact', type_norm)
+    
     def _are_types_compatible(self, type1: str, type2: str) -> bool:
         """
         Check if two column types are compatible for joining.
@@ -496,32 +966,19 @@ class ERDAnalyzer:
         Returns:
             bool: True if types are compatible
         """
-        # Normalize types for comparison
-        type1_norm = type1.lower().replace('nullable(', '').replace(')', '')
-        type2_norm = type2.lower().replace('nullable(', '').replace(')', '')
-        
-        # Exact match
-        if type1_norm == type2_norm:
-            return True
-        
-        # Numeric type compatibility
-        numeric_types = ['int8', 'int16', 'int32', 'int64', 'uint8', 'uint16', 'uint32', 'uint64', 'float32', 'float64']
-        if type1_norm in numeric_types and type2_norm in numeric_types:
-            return True
-        
-        # String type compatibility
-        if 'string' in type1_norm and 'string' in type2_norm:
-            return True
-        
-        return False
+        # Types are compatible exactly when they fall in the same (cached) type family
+        return self._type_bucket(type1) == self._type_bucket(type2)
     
-    def _calculate_join_confidence(self, col1: Dict[str, Any], col2: Dict[str, Any]) -> float:
+    def _calculate_join_confidence(self, col1: Dict[str, Any], col2: Dict[str, Any],
+                                   types_compatible: bool) -> float:
         """
         Calculate confidence score for a potential join.
         
         Args:
             col1 (Dict[str, Any]): First column info
             col2 (Dict[str, Any]): Second column info
+            types_compatible (bool): Result of _are_types_compatible for the two columns,
+                already computed by the caller
             
         Returns:
             float: Join confidence score (0-1)
@@ -532,7 +989,7 @@ class ERDAnalyzer:
         confidence += 0.3
         
         # Type compatibility bonus
-        if self._are_types_compatible(col1['type'], col2['type']):
+        if types_compatible:
             confidence += 0.2
         
         # Primary key candidate bonus
@@ -618,36 +1075,61 @@ class ERDAnalyzer:
         Returns:
             Dict[str, Any]: Complete ERD metadata
         """
-        # Discover tables for the schema
-        if schema_name == 'silver':
-            tables = self.discover_stage1_tables()
-        else:
-            tables = self.discover_tables_for_schema(schema_name, table_pattern, exclude_pattern)
+        # One timestamp for the whole run, shared by every table's metadata
+        analysis_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        # Discover tables and their column structures (cached while the schema is unchanged)
+        tables, columns_by_table = self._discover_schema(schema_name, table_pattern, exclude_pattern)
         
         # Reset table metadata for new analysis
         self.table_metadata = {}
         
-        # Analyze each table
-        for table_name in tables:
-            self.analyze_table_metadata(table_name, schema_name)
+        # Tables whose data is unchanged since a previous run reuse their cached stats
+        freshness_tokens = self._data_freshness_tokens(tables, schema_name)
+        
+        # Analyze tables concurrently; each one is a few blocking ClickHouse queries.
+        # The shared DatabaseManager workers keep their clients between runs; at most
+        # erd_parallelism tables are in flight at once.
+        if tables:
+            executor = self.db_manager.get_worker_executor()
+            results = []
+            in_flight = deque()
+            for table in tables:
+                if len(in_flight) >= self.erd_parallelism:
+                    results.append(in_flight.popleft().result())
+                in_flight.append(executor.submit(
+                    self.analyze_table_metadata,
+                    table, schema_name, columns_by_table.get(table, []), analysis_timestamp,
+                    freshness_tokens.get(table)
+                ))
+            results.extend(future.result() for future in in_flight)
+            
+            # Rebuild in discovery order; failed tables return {} and are left out
+            self.table_metadata = {table: metadata for table, metadata in zip(tables, results) if metadata}
         
         # Find join relationships with confidence threshold
         relationships = self.find_join_relationships(confidence_threshold=confidence_threshold, schema_name=schema_name)
         
+        # Summary counts in one pass over the analyzed tables
+        table_type_counts = defaultdict(int)
+        primary_key_candidates = 0
+        for table in self.table_metadata.values():
+            table_type_counts[table['table_type']] += 1
+            primary_key_candidates += sum(1 for col in table['columns'] if col['is_primary_key_candidate'])
+        
         # Generate ERD metadata
         erd_metadata = {
             'schema_name': schema_name,
-            'analysis_timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'analysis_timestamp': analysis_timestamp,
             'total_tables': len(tables),
             'total_relationships': len(relationships),
             'tables': self.table_metadata,
             'relationships': relationships,
             'summary': {
-                'fact_tables': len([t for t in self.table_metadata.values() if t['table_type'] == 'fact']),
-                'dimension_tables': len([t for t in self.table_metadata.values() if t['table_type'] == 'dimension']),
-                'high_confidence_relationships': len([r for r in relationships if r['join_confidence'] > 0.7]),
-                'primary_key_candidates': sum(len([c for c in t['columns'] if c['is_primary_key_candidate']]) 
-                                            for t in self.table_metadata.values())
+                'fact_tables': table_type_counts['fact'],
+                'dimension_tables': table_type_counts['dimension'],
+                'high_confidence_relationships': self.high_confidence_count,
+                'primary_key_candidates': primary_key_candidates
             }
         }
         
@@ -691,45 +1173,50 @@ class ERDAnalyzer:
             
             # Delete existing entries for this schema only (preserve other schemas)
             if preserve_existing:
-                delete_sql = f"DELETE FROM metadata.erd WHERE schema_name = '{schema_name}'"
+                delete_sql = "DELETE FROM metadata.erd WHERE schema_name = {schema_name:String}"
                 try:
-                    self.db_manager.execute_command(delete_sql)
+                    self.db_manager.execute_command(delete_sql, parameters={'schema_name': schema_name})
                     logger.info(f"Deleted existing ERD metadata for schema {schema_name} (preserving other schemas)")
                 except Exception as e:
                     logger.warning(f"Could not delete existing ERD metadata for schema {schema_name}: {e}")
             
-            # Insert ERD metadata
+            analysis_timestamp = erd_metadata['analysis_timestamp']
+            if isinstance(analysis_timestamp, str):
+                analysis_timestamp = datetime.strptime(analysis_timestamp, '%Y-%m-%d %H:%M:%S')
+            
+            # Build every ERD row, then insert them in one batch
+            erd_rows = []
+            # Index relationship strings by both of their tables in one pass
+            relationships_by_table = defaultdict(list)
+            for rel in erd_metadata['relationships']:
+                rel_str = f"{rel['table1']}.{rel['column1']} = {rel['table2']}.{rel['column2']}"
+                relationships_by_table[rel['table1']].append(rel_str)
+                if rel['table2'] != rel['table1']:
+                    relationships_by_table[rel['table2']].append(rel_str)
+            
             for table_name, table_metadata in erd_metadata['tables'].items():
-                pk_candidates = [col['column_name'] for col in table_metadata['columns'] 
-                               if col['is_primary_key_candidate']]
-                fact_columns = [col['column_name'] for col in table_metadata['columns'] 
-                              if col['classification'] == 'fact']
-                dimension_columns = [col['column_name'] for col in table_metadata['columns'] 
-                                   if col['classification'] == 'dimension']
+                pk_candidates, fact_columns, dimension_columns = _column_groups(table_metadata['columns'])
                 
                 # Get relationships for this table
-                table_relationships = [
-                    f"{rel['table1']}.{rel['column1']} = {rel['table2']}.{rel['column2']}"
-                    for rel in erd_metadata['relationships']
-                    if rel['table1'] == table_name or rel['table2'] == table_name
-                ]
+                table_relationships = relationships_by_table.get(table_name, [])
                 
-                insert_sql = f"""
-                INSERT INTO metadata.erd (
-                    id, schema_name, analysis_timestamp, table_name, table_type,
-                    row_count, column_count, primary_key_candidates, fact_columns,
-                    dimension_columns, relationships, metadata_json
-                ) VALUES (
-                    {hash(table_name) % 2**63}, '{erd_metadata['schema_name']}',
-                    '{erd_metadata['analysis_timestamp']}', '{table_name}',
-                    '{table_metadata['table_type']}', {table_metadata['row_count']},
-                    {table_metadata['column_count']}, {repr(pk_candidates)},
-                    {repr(fact_columns)}, {repr(dimension_columns)}, {repr(table_relationships)},
-                    '{str(table_metadata).replace("'", "''")}'
-                )
-                """
-                
-                self.db_manager.execute_query(insert_sql)
+                erd_rows.append([
+                    zlib.crc32(f"{erd_metadata['schema_name']}.{table_name}".encode()),
+                    erd_metadata['schema_name'],
+                    analysis_timestamp,
+                    table_name,
+                    table_metadata['table_type'],
+                    table_metadata['row_count'],
+                    table_metadata['column_count'],
+                    pk_candidates,
+                    fact_columns,
+                    dimension_columns,
+                    table_relationships,
+                    json.dumps(table_metadata, default=str)
+                ])
+            
+            if not self.db_manager.insert_rows('metadata.erd', erd_rows, column_names=_ERD_INSERT_COLUMNS):
+                raise RuntimeError("Failed to insert ERD metadata rows")
             
             logger.info(f"Stored ERD metadata for {len(erd_metadata['tables'])} tables")
             return True
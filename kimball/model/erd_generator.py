@@ -8,7 +8,9 @@ This module provides ERD generation functionality for the Model phase:
 - Schema validation
 """
 
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
+from collections import defaultdict
+from itertools import combinations
 import json
 import uuid
 from datetime import datetime
@@ -40,8 +42,11 @@ class ERDGenerator:
         try:
             self.logger.info(f"Generating ERD for catalog: {catalog_id}")
             
+            # One timestamp for both the ERD ID and its metadata
+            now = datetime.now()
+            
             # Generate ERD ID
-            erd_id = f"erd_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+            erd_id = f"erd_{now.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
             
             # Load catalog data (in production, this would load from storage)
             catalog_data = self._load_catalog_data(catalog_id)
@@ -64,7 +69,7 @@ class ERDGenerator:
                 "entities": entities,
                 "relationships": relationships,
                 "metadata": {
-                    "generated_at": datetime.now().isoformat(),
+                    "generated_at": now.isoformat(),
                     "total_entities": len(entities),
                     "total_relationships": len(relationships),
                     "include_attributes": include_attributes,
@@ -146,14 +151,24 @@ class ERDGenerator:
             
             # This is a simplified relationship generation
             # In production, this would use the relationship finder
-            tables = list(catalog_data.get("tables", {}).keys())
+            tables = catalog_data.get("tables", {})
+            table_positions = {table_name: i for i, table_name in enumerate(tables)}
+            
+            # Inverted index: lower-cased column name -> tables containing it, in table order
+            col_index: Dict[str, List[str]] = defaultdict(list)
+            for table_name, table_data in tables.items():
+                for name in dict.fromkeys(col.get("name", "").lower() for col in table_data.get("columns", [])):
+                    col_index[name].append(table_name)
             
-            for i, table1 in enumerate(tables):
-                for table2 in tables[i+1:]:
-                    # Check for potential relationships
-                    relationship = self._find_potential_relationship(table1, table2, catalog_data)
-                    if relationship:
-                        relationships.append(relationship)
+            # Only columns shared by two or more tables produce candidate pairs
+            common_columns = defaultdict(list)
+            for name, column_tables in col_index.items():
+                for table1, table2 in combinations(column_tables, 2):
+                    common_columns[(table1, table2)].append(name)
+            
+            # Emit in table-pair order, as a pairwise scan would
+            for table1, table2 in sorted(common_columns, key=lambda pair: (table_positions[pair[0]], table_positions[pair[1]])):
+                relationships.append(self._build_relationship(table1, table2, common_columns[(table1, table2)]))
             
             return relationships
             
@@ -161,34 +176,18 @@ class ERDGenerator:
             self.logger.error(f"Error generating relationships: {str(e)}")
             return []
     
-    def _find_potential_relationship(self, table1: str, table2: str, catalog_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Find potential relationship between two tables."""
-        try:
-            # Simple relationship detection based on column names
-            table1_data = catalog_data.get("tables", {}).get(table1, {})
-            table2_data = catalog_data.get("tables", {}).get(table2, {})
-            
-            table1_columns = [col.get("name", "").lower() for col in table1_data.get("columns", [])]
-            table2_columns = [col.get("name", "").lower() for col in table2_data.get("columns", [])]
-            
-            # Look for common column names
-            common_columns = set(table1_columns) & set(table2_columns)
-            
-            if common_columns:
-                return {
-                    "id": f"rel_{table1}_{table2}",
-                    "from_entity": f"entity_{table1}",
-                    "to_entity": f"entity_{table2}",
-                    "type": "one_to_many",
-                    "columns": list(common_columns),
-                    "confidence": 0.7
-                }
-            
-            return None
-            
-        except Exception as e:
-            self.logger.error(f"Error finding relationship: {str(e)}")
-            return None
+    def _build_relationship(self, table1: str, table2: str, columns: List[str]) -> Dict[str, Any]:
+        """Build a relationship between two tables sharing the given column names."""
+        return {
+            "id": f"rel_{table1}_{table2}",
+            "from_entity": f"entity_{table1}",
+            "to_entity": f"entity_{table2}",
+            "from_name": table1,
+            "to_name": table2,
+            "type": "one_to_many",
+            "columns": columns,
+            "confidence": 0.7
+        }
     
     def edit_erd(self, erd_id: str, edits: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -250,10 +249,13 @@ class ERDGenerator:
             # Validate entities
             entity_ids = {entity["id"] for entity in erd_data["entities"]}
             
-            # Validate relationships
+            # Validate relationships, collecting referenced entities in the same pass
+            referenced_entities = set()
             for relationship in erd_data["relationships"]:
                 from_entity = relationship.get("from_entity")
                 to_entity = relationship.get("to_entity")
+                referenced_entities.add(from_entity)
+                referenced_entities.add(to_entity)
                 
                 if from_entity not in entity_ids:
                     validation_result["errors"].append(f"Relationship references non-existent entity: {from_entity}")
@@ -264,11 +266,6 @@ class ERDGenerator:
                     validation_result["valid"] = False
             
             # Check for orphaned entities
-            referenced_entities = set()
-            for relationship in erd_data["relationships"]:
-                referenced_entities.add(relationship.get("from_entity"))
-                referenced_entities.add(relationship.get("to_entity"))
-            
             orphaned_entities = entity_ids - referenced_entities
             if orphaned_entities:
                 validation_result["warnings"].append(f"Orphaned entities found: {orphaned_entities}")
@@ -309,25 +306,44 @@ class ERDGenerator:
             self.logger.error(f"Error exporting ERD: {str(e)}")
             raise
     
+    def _relationship_entity_names(self, relationship: Dict[str, Any], name_by_id: Dict[str, str]) -> Tuple[str, str]:
+        """Get the (from, to) entity names of a relationship from its current entity ids."""
+        return (
+            self._entity_name(relationship["from_entity"], relationship.get("from_name"), name_by_id),
+            self._entity_name(relationship["to_entity"], relationship.get("to_name"), name_by_id)
+        )
+    
+    def _entity_name(self, entity_id: str, stored_name: Optional[str], name_by_id: Dict[str, str]) -> str:
+        """Resolve an entity id to its name; a name stored at generation time is used only while it still matches the id."""
+        if entity_id in name_by_id:
+            return name_by_id[entity_id]
+        if stored_name and entity_id == f"entity_{stored_name}":
+            return stored_name
+        return entity_id.replace("entity_", "")
+    
     def _export_to_mermaid(self, erd_data: Dict[str, Any]) -> str:
         """Export ERD to Mermaid format."""
-        try:
-            mermaid_lines = ["erDiagram"]
+        def mermaid_lines():
+            yield "erDiagram"
+            
+            # Entity names by id; relationships resolve through their current entity ids
+            name_by_id = {entity["id"]: entity["name"] for entity in erd_data["entities"]}
             
             # Add entities
             for entity in erd_data["entities"]:
-                mermaid_lines.append(f"    {entity['name']} {{")
+                yield f"    {entity['name']} {{"
                 for attr in entity["attributes"]:
-                    mermaid_lines.append(f"        {attr['type']} {attr['name']}")
-                mermaid_lines.append("    }")
+                    yield f"        {attr['type']} {attr['name']}"
+                yield "    }"
             
             # Add relationships
             for relationship in erd_data["relationships"]:
-                from_entity = relationship["from_entity"].replace("entity_", "")
-                to_entity = relationship["to_entity"].replace("entity_", "")
-                mermaid_lines.append(f"    {from_entity} ||--o{{ {to_entity} : \"{relationship.get('type', 'relates')}\"")
-            
-            return "\n".join(mermaid_lines)
+                from_entity, to_entity = self._relationship_entity_names(relationship, name_by_id)
+                yield f"    {from_entity} ||--o{{ {to_entity} : \"{relationship.get('type', 'relates')}\""
+        
+        try:
+            # Lines are streamed straight into the join
+            return "\n".join(mermaid_lines())
             
         except Exception as e:
             self.logger.error(f"Error exporting to Mermaid: {str(e)}")
@@ -335,25 +351,30 @@ class ERDGenerator:
     
     def _export_to_dot(self, erd_data: Dict[str, Any]) -> str:
         """Export ERD to DOT format."""
-        try:
-            dot_lines = ["digraph ERD {"]
-            dot_lines.append("    rankdir=LR;")
-            dot_lines.append("    node [shape=record];")
+        def dot_lines():
+            yield "digraph ERD {"
+            yield "    rankdir=LR;"
+            yield "    node [shape=record];"
+            
+            # Entity names by id; relationships resolve through their current entity ids
+            name_by_id = {entity["id"]: entity["name"] for entity in erd_data["entities"]}
             
             # Add entities
             for entity in erd_data["entities"]:
                 entity_name = entity["name"]
                 attributes = "|".join([attr["name"] for attr in entity["attributes"]])
-                dot_lines.append('    {} [label="{{{}|{}}}"];'.format(entity_name, entity_name, attributes))
+                yield '    {} [label="{{{}|{}}}"];'.format(entity_name, entity_name, attributes)
             
             # Add relationships
             for relationship in erd_data["relationships"]:
-                from_entity = relationship["from_entity"].replace("entity_", "")
-                to_entity = relationship["to_entity"].replace("entity_", "")
-                dot_lines.append(f"    {from_entity} -> {to_entity};")
+                from_entity, to_entity = self._relationship_entity_names(relationship, name_by_id)
+                yield f"    {from_entity} -> {to_entity};"
             
-            dot_lines.append("}")
-            return "\n".join(dot_lines)
+            yield "}"
+        
+        try:
+            # Lines are streamed straight into the join
+            return "\n".join(dot_lines())
             
         except Exception as e:
             self.logger.error(f"Error exporting to DOT: {str(e)}")
@@ -37,3 +37,68 @@ def fastapi_url():
 def streamlit_url():
     """Return the Streamlit frontend URL."""
     return "http://localhost:8501"
+
+class FakeDatabaseManager:
+    """
+    In-memory stand-in for DatabaseManager used by the unit tests.
+    
+    Queries are answered by the first registered handler whose fragment occurs in the
+    SQL text. A handler is a list of row dicts or a callable taking (query, parameters);
+    returning None simulates a failed query, as DatabaseManager.execute_query_dict does.
+    """
+    
+    def __init__(self):
+        self.handlers = []
+        self.queries = []
+        self.commands = []
+        self.inserts = []
+        self._executor = None
+    
+    def on(self, fragment, response):
+        """Answer queries containing fragment with response."""
+        self.handlers.append((fragment, response))
+        return self
+    
+    def execute_query_dict(self, query, connection_type="clickhouse", parameters=None):
+        self.queries.append((query, parameters))
+        for fragment, response in self.handlers:
+            if fragment in query:
+                rows = response(query, parameters) if callable(response) else response
+                return [dict(row) for row in rows] if rows is not None else None
+        return []
+    
+    def execute_query_iter(self, query, connection_type="clickhouse", parameters=None):
+        rows = self.execute_query_dict(query, connection_type, parameters)
+        if rows is None:
+            raise RuntimeError(f"query failed: {query[:60]}")
+        return iter(rows)
+    
+    def execute_query(self, query, connection_type="clickhouse"):
+        self.commands.append((query, None))
+        return []
+
+    def execute_command(self, command, connection_type="clickhouse", parameters=None):
+        self.commands.append((command, parameters))
+        return True
+    
+    def insert_rows(self, table, rows, column_names, connection_type="clickhouse"):
+        self.inserts.append((table, [list(row) for row in rows], list(column_names)))
+        return True
+    
+    def get_worker_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=4)
+        return self._executor
+    
+    def count_queries(self, fragment):
+        """Number of queries run so far whose SQL contains fragment."""
+        return sum(1 for query, _ in self.queries if fragment in query)
+
+@pytest.fixture
+def fake_db():
+    """Return a fresh FakeDatabaseManager."""
+    db = FakeDatabaseManager()
+    yield db
+    if db._executor is not None:
+        db._executor.shutdown(wait=True)
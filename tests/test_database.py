@@ -0,0 +1,161 @@
+"""
+Unit tests for DatabaseManager client handling and the shared worker pool.
+
+clickhouse_connect.get_client is replaced by a factory of fake clients.
+"""
+
+import json
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from kimball.core import database as database_module
+from kimball.core.database import DatabaseManager
+
+
+class FakeStream:
+    """Row block stream returning the whole result as one block."""
+
+    def __init__(self, result):
+        self.source = result
+
+    def __iter__(self):
+        return iter([self.source.result_rows])
+
+
+class FakeClient:
+    """Records the queries and inserts it receives and the threads they came from."""
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self.queries = []
+        self.inserts = []
+        self.closed = False
+
+    def query(self, query, parameters=None):
+        self.queries.append((threading.get_ident(), query, parameters))
+        if 'fail' in query:
+            raise RuntimeError('query failed')
+        return SimpleNamespace(column_names=('id', 'name'), result_rows=[(1, 'a'), (2, 'b')])
+
+    @contextmanager
+    def query_row_block_stream(self, query, parameters=None):
+        result = self.query(query, parameters)
+        yield FakeStream(result)
+
+    def insert(self, table, rows, column_names=None):
+        self.inserts.append((table, rows, column_names))
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    """Every fake client created through clickhouse_connect.get_client."""
+    created = []
+
+    def get_client(**settings):
+        client = FakeClient(**settings)
+        created.append(client)
+        return client
+
+    monkeypatch.setattr(database_module, 'clickhouse_connect', SimpleNamespace(get_client=get_client))
+    monkeypatch.setattr(DatabaseManager, '_worker_local', threading.local())
+    monkeypatch.setattr(DatabaseManager, '_worker_executor', None)
+    yield created
+    if DatabaseManager._worker_executor is not None:
+        DatabaseManager._worker_executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    """Config file with a two-thread worker pool."""
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({'clickhouse': {'host': 'ch', 'port': 8123, 'worker_threads': 2}}))
+    return str(path)
+
+
+def make_manager(config_file):
+    return DatabaseManager(config_file=config_file, skip_logger_init=True)
+
+
+def test_owner_thread_reuses_its_client(clients, config_file):
+    db = make_manager(config_file)
+
+    assert db.execute_query_dict('SELECT 1') == [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}]
+    db.execute_query_dict('SELECT 2')
+
+    assert len(clients) == 1
+    assert clients[0].settings['host'] == 'ch'
+    assert len(clients[0].queries) == 2
+
+
+def run_in_thread(target):
+    """Run target in a new thread and wait for it."""
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+
+
+def test_worker_threads_get_their_own_long_lived_clients(clients, config_file):
+    # Routes create a manager per request and hand its queries to other threads
+    first_request, second_request = make_manager(config_file), make_manager(config_file)
+    first_request.execute_query_dict('SELECT 1')
+
+    def worker():
+        first_request.execute_query_dict('SELECT 2')
+        second_request.execute_query_dict('SELECT 3')
+
+    run_in_thread(worker)
+    run_in_thread(worker)
+
+    owner_client, first_worker, second_worker = clients
+    assert [query for _, query, _ in owner_client.queries] == ['SELECT 1']
+    # One client per thread, shared by both managers
+    assert [query for _, query, _ in first_worker.queries] == ['SELECT 2', 'SELECT 3']
+    assert [query for _, query, _ in second_worker.queries] == ['SELECT 2', 'SELECT 3']
+
+
+def test_worker_executor_is_shared_and_sized_from_config(clients, config_file):
+    executor = make_manager(config_file).get_worker_executor()
+
+    assert make_manager(config_file).get_worker_executor() is executor
+    assert executor._max_workers == 2
+    thread_name = executor.submit(lambda: threading.current_thread().name).result()
+    assert thread_name.startswith('kimball-db')
+
+
+def test_dict_queries_return_none_on_error_and_streams_raise(clients, config_file):
+    db = make_manager(config_file)
+
+    assert db.execute_query_dict('SELECT fail') is None
+    assert list(db.execute_query_iter('SELECT 1')) == [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}]
+    with pytest.raises(RuntimeError):
+        list(db.execute_query_iter('SELECT fail'))
+
+
+def test_insert_rows_sends_one_batch_with_column_names(clients, config_file):
+    db = make_manager(config_file)
+
+    assert db.insert_rows('metadata.erd', [[1, 'a'], [2, 'b']], column_names=('id', 'name'))
+    assert db.insert_rows('metadata.erd', [], column_names=('id', 'name'))
+
+    assert clients[0].inserts == [('metadata.erd', [[1, 'a'], [2, 'b']], ['id', 'name'])]
+
+
+def test_close_all_connections_closes_the_calling_threads_client(clients, config_file):
+    db = make_manager(config_file)
+
+    def worker():
+        db.execute_query_dict('SELECT 1')
+        db.close_all_connections()
+        db.execute_query_dict('SELECT 2')
+
+    run_in_thread(worker)
+
+    closed_client, reopened_client = clients
+    assert closed_client.closed and not reopened_client.closed
+    assert [query for _, query, _ in reopened_client.queries] == ['SELECT 2']
@@ -0,0 +1,166 @@
+"""
+Unit tests for DimensionalModelRecommender metadata caching and classification.
+
+ClickHouse is replaced by the FakeDatabaseManager from conftest.py.
+"""
+
+from datetime import datetime
+
+import pytest
+
+from kimball.model import dimensional_model_recommender as recommender_module
+from kimball.model.dimensional_model_recommender import DimensionalModelRecommender
+
+
+@pytest.fixture
+def metadata_state():
+    """Mutable metadata the fake database answers from."""
+    return {
+        'root_column': 'region',
+        'metadata_parts': (datetime(2024, 1, 1, 12, 0, 0), 3),
+    }
+
+
+@pytest.fixture
+def recommender(fake_db, metadata_state, monkeypatch):
+    """Recommender wired to the fake database, with empty class-level caches."""
+    monkeypatch.setattr(recommender_module, 'DatabaseManager', lambda: fake_db)
+    monkeypatch.setattr(DimensionalModelRecommender, '_metadata_cache', None)
+    monkeypatch.setattr(DimensionalModelRecommender, '_gold_erd_cache', None)
+
+    def token_rows(query, parameters):
+        analysis_ts = datetime(2024, 1, 1, 9, 0, 0)
+        row = {
+            'erd_ts': analysis_ts,
+            'erd_rows': 1,
+            'hierarchy_ts': analysis_ts,
+            'hierarchy_rows': 1,
+            'discover_version': 1,
+            'discover_rows': 0,
+            'stage1_tables': ['geo_stage1'],
+        }
+        # Only answer the columns the token query actually selects
+        if 'system.parts' in query:
+            row['metadata_parts'] = metadata_state['metadata_parts']
+        return [row]
+
+    fake_db.on('AS hierarchy_rows', token_rows)
+    fake_db.on('fact_columns', [])
+    fake_db.on('parent_child_relationships', lambda query, parameters: [{
+        'table_name': 'geo_stage1',
+        'hierarchy_name': 'geo',
+        'root_column': metadata_state['root_column'],
+        'leaf_column': 'city',
+        'intermediate_levels': [],
+        'parent_child_relationships': [],
+        'sibling_relationships': [],
+    }])
+    fake_db.on('groupArray(tuple(new_column_name', [])
+    fake_db.on('SELECT name', [{'name': 'geo_stage1'}])
+    return DimensionalModelRecommender()
+
+
+def test_analyze_metadata_reuses_cache_while_token_unchanged(recommender, fake_db):
+    first = recommender.analyze_metadata()
+    second = recommender.analyze_metadata()
+
+    assert first == second
+    assert fake_db.count_queries('parent_child_relationships') == 1
+
+
+def test_analyze_metadata_returns_fresh_data_after_hierarchy_edit(recommender, fake_db, metadata_state):
+    assert recommender.analyze_metadata()['hierarchies']['geo_stage1']['root_column'] == 'region'
+
+    # ALTER TABLE metadata.hierarchies UPDATE keeps row counts and analysis_timestamp,
+    # but rewrites the affected parts
+    metadata_state['root_column'] = 'country'
+    metadata_state['metadata_parts'] = (datetime(2024, 1, 1, 12, 5, 0), 3)
+
+    assert recommender.analyze_metadata()['hierarchies']['geo_stage1']['root_column'] == 'country'
+    assert fake_db.count_queries('parent_child_relationships') == 2
+
+
+def test_analyze_metadata_is_not_cached_without_token(recommender, fake_db):
+    fake_db.handlers[0] = ('AS hierarchy_rows', lambda query, parameters: None)
+
+    recommender.analyze_metadata()
+    recommender.analyze_metadata()
+
+    assert fake_db.count_queries('parent_child_relationships') == 2
+
+
+def test_analyze_metadata_result_changes_do_not_reach_cache(recommender):
+    result = recommender.analyze_metadata()
+    result['hierarchies'].pop('geo_stage1')
+    result['stage1_tables'].append('other_stage1')
+
+    cached = recommender.analyze_metadata()
+    assert 'geo_stage1' in cached['hierarchies']
+    assert cached['stage1_tables'] == ['geo_stage1']
+
+
+def stage3_recommendation(name):
+    """Recommendation row as read back from metadata.dimensional_model."""
+    return {
+        'recommended_name': f'{name}_dim',
+        'final_name': f'{name}_final_dim',
+        'table_type': 'dimension',
+        'source_table': f'{name}_stage1',
+        'columns': ['code', 'label'],
+        'column_details': [],
+    }
+
+
+def test_stage3_falls_back_to_first_id_when_transformation3_is_unreadable(recommender, fake_db):
+    fake_db.on('FROM metadata.transformation3', lambda query, parameters: None)
+    fake_db.on('FROM metadata.dimensional_model', [
+        stage3_recommendation('product'),
+        stage3_recommendation('store'),
+    ])
+
+    result = recommender.generate_stage3_transformations()
+
+    assert [t['transformation_id'] for t in result['transformations']] == [1, 2]
+    (table, rows, column_names), = fake_db.inserts
+    assert table == 'metadata.transformation3'
+    id_index = column_names.index('transformation_id')
+    assert sorted({row[id_index] for row in rows}) == [1, 2]
+
+
+def test_stage3_continues_after_existing_transformation_ids(recommender, fake_db):
+    fake_db.on('FROM metadata.transformation3', [{'max_id': 41}])
+    fake_db.on('FROM metadata.dimensional_model', [stage3_recommendation('product')])
+
+    result = recommender.generate_stage3_transformations()
+
+    assert [t['transformation_id'] for t in result['transformations']] == [42]
+
+
+@pytest.mark.parametrize('data_type, expected', [
+    ('Int32', True),
+    ('UInt64', True),
+    ('Float64', True),
+    ('Decimal(18, 2)', True),
+    ('Nullable(Decimal(18, 2))', True),
+    ('LowCardinality(Nullable(Float32))', True),
+    ('Nullable(Int8)', True),
+    ('BFloat16', True),
+    ('String', False),
+    ('Nullable(String)', False),
+    ('DateTime', False),
+    ('Array(Int32)', False),
+    ('Map(String, Float64)', False),
+    ('Point', False),
+    ('IntervalDay', False),
+])
+def test_fact_column_type_classification(data_type, expected):
+    # Neutral names, so only the type decides
+    assert DimensionalModelRecommender._is_fact_column(data_type, 'reading', 'sensor_stage1') is expected
+
+
+def test_fact_column_name_rules_take_precedence_over_type():
+    is_fact = DimensionalModelRecommender._is_fact_column
+    assert is_fact('String', 'sales_amount', 'orders_stage1')
+    assert not is_fact('Int64', 'customer_id', 'orders_stage1')
+    assert not is_fact('Int32', 'order_year', 'orders_stage1')
+    assert not is_fact('Float64', 'amount', 'calendar_stage1')
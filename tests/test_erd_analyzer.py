@@ -0,0 +1,344 @@
+"""
+Unit tests for ERDAnalyzer join discovery, column statistics and caching.
+
+ClickHouse is replaced by the FakeDatabaseManager from conftest.py.
+"""
+
+import re
+from datetime import datetime
+
+import pytest
+
+from kimball.model import erd_analyzer as erd_module
+from kimball.model.erd_analyzer import ERDAnalyzer
+
+
+@pytest.fixture
+def analyzer(fake_db, monkeypatch):
+    """ERDAnalyzer wired to the fake database, with empty class-level caches."""
+    monkeypatch.setattr(erd_module, 'DatabaseManager', lambda: fake_db)
+    monkeypatch.setattr(ERDAnalyzer, '_schema_cache', {})
+    monkeypatch.setattr(ERDAnalyzer, '_stats_cache', {})
+    return ERDAnalyzer()
+
+
+def analyzed_column(name, data_type, cardinality, row_count, classification='dimension', is_pk=False):
+    """Build a column entry as produced by _analyze_column."""
+    return {
+        'column_name': name,
+        'data_type': data_type,
+        'cardinality': cardinality,
+        'is_primary_key_candidate': is_pk,
+        'classification': classification,
+        'cardinality_ratio': cardinality / row_count,
+    }
+
+
+def answer_overlaps(values):
+    """
+    Answer _fetch_overlap_counts queries from in-memory distinct values.
+
+    Args:
+        values: (table, column) -> set of distinct values
+    """
+    def handler(query, parameters):
+        row = {}
+        for index in re.findall(r'as n_(\d+)', query):
+            key = (parameters[f't_{index}'], parameters[f'col_{index}'])
+            row[f'n_{index}'] = len(values[key])
+        for i, j in re.findall(r'as o_(\d+)_(\d+)', query):
+            key_i = (parameters[f't_{i}'], parameters[f'col_{i}'])
+            key_j = (parameters[f't_{j}'], parameters[f'col_{j}'])
+            row[f'o_{i}_{j}'] = len(values[key_i] & values[key_j])
+        return [row]
+    return handler
+
+
+def test_small_dimension_natural_key_is_still_joined(analyzer, fake_db):
+    countries = {f'country_{n}' for n in range(50)}
+    analyzer.table_metadata = {
+        'sales_stage1': {'columns': [
+            analyzed_column('country', 'String', 50, 10000),
+            analyzed_column('amount', 'Float64', 9000, 10000, classification='fact'),
+        ]},
+        # Unique, but not a primary key candidate by name
+        'country_stage1': {'columns': [
+            analyzed_column('country', 'String', 50, 50),
+            analyzed_column('country_name', 'String', 50, 50),
+        ]},
+        'returns_stage1': {'columns': [
+            analyzed_column('amount', 'Float64', 900, 1000, classification='fact'),
+        ]},
+    }
+    fake_db.on('bitmapAndCardinality', answer_overlaps({
+        ('sales_stage1', 'country'): countries,
+        ('country_stage1', 'country'): countries,
+        ('country_stage1', 'country_name'): {f'Country {n}' for n in range(50)},
+        ('sales_stage1', 'amount'): {float(n) for n in range(9000)},
+        ('returns_stage1', 'amount'): {float(n) for n in range(900)},
+    }))
+
+    relationships = analyzer.find_join_relationships(confidence_threshold=0.8)
+
+    pairs = {(r['table1'], r['column1'], r['table2'], r['column2']) for r in relationships}
+    assert ('sales_stage1', 'country', 'country_stage1', 'country') in pairs
+    # Float/decimal measures are never compared
+    assert not any('amount' in (r['column1'], r['column2']) for r in relationships)
+
+
+def test_relationships_are_sorted_by_confidence_and_counted(analyzer, fake_db):
+    codes = {f'c{n}' for n in range(100)}
+    analyzer.table_metadata = {
+        'orders_stage1': {'columns': [analyzed_column('code', 'String', 100, 1000)]},
+        'codes_stage1': {'columns': [analyzed_column('code', 'String', 100, 100)]},
+        'legacy_stage1': {'columns': [analyzed_column('code', 'String', 120, 120)]},
+    }
+    fake_db.on('bitmapAndCardinality', answer_overlaps({
+        ('orders_stage1', 'code'): codes,
+        ('codes_stage1', 'code'): codes,
+        # 90 of 100 shared codes: above the threshold, below a full match
+        ('legacy_stage1', 'code'): {f'c{n}' for n in range(90)} | {f'x{n}' for n in range(30)},
+    }))
+
+    relationships = analyzer.find_join_relationships(confidence_threshold=0.8)
+
+    confidences = [r['join_confidence'] for r in relationships]
+    assert confidences == sorted(confidences, reverse=True)
+    assert confidences[0] == 1.0
+    assert analyzer.high_confidence_count == len(relationships)
+
+
+@pytest.fixture
+def silver_schema(fake_db):
+    """Answer schema discovery for two stage1 tables; the token can be changed in place."""
+    state = {'token': (datetime(2024, 1, 1, 12, 0, 0), 2)}
+    fake_db.on('metadata_modification_time', lambda query, parameters: [
+        {'last_modified': state['token'][0], 'table_count': state['token'][1]}
+    ])
+    fake_db.on('SELECT name', [{'name': 'orders_stage1'}, {'name': 'codes_stage1'}])
+    fake_db.on('FROM system.columns', [
+        {'table': 'orders_stage1', 'column_name': 'code', 'data_type': 'String'},
+        {'table': 'codes_stage1', 'column_name': 'code', 'data_type': 'String'},
+    ])
+    return state
+
+
+def test_invalidate_cache_forces_schema_rediscovery(analyzer, fake_db, silver_schema):
+    analyzer._discover_schema('silver')
+    analyzer._discover_schema('silver')
+    assert fake_db.count_queries('FROM system.columns') == 1
+
+    ERDAnalyzer.invalidate_cache()
+
+    tables, columns_by_table = analyzer._discover_schema('silver')
+    assert tables == ['orders_stage1', 'codes_stage1']
+    assert columns_by_table['codes_stage1'][0]['column_name'] == 'code'
+    assert fake_db.count_queries('FROM system.columns') == 2
+
+
+def answer_column_stats(data, failing=(), approximate=None):
+    """
+    Answer _query_column_stats queries from in-memory column values.
+    
+    Args:
+        data: column name -> list of values (None for NULL)
+        failing: column names whose presence makes the query fail
+        approximate: column name -> cardinality to report from uniq()
+    """
+    approximate = approximate or {}
+
+    def handler(query, parameters):
+        names = {int(key[4:]): name for key, name in parameters.items() if key.startswith('col_')}
+        if any(name in failing for name in names.values()):
+            return None
+        row = {'total_count': len(next(iter(data.values())))}
+        for i, name in names.items():
+            values = [value for value in data[name] if value is not None]
+            row[f'c_{i}'] = approximate.get(name, len(set(values)))
+            row[f'n_{i}'] = len(data[name]) - len(values)
+            row[f's_{i}'] = sorted(set(values))[:5]
+        return [row]
+    return handler
+
+
+def stage1_columns(*specs):
+    """system.columns rows for (name, type) pairs."""
+    return [{'column_name': name, 'data_type': data_type} for name, data_type in specs]
+
+
+ORDERS = {
+    'order_id': list(range(1, 1001)),
+    'region': ['north', 'south', None, 'east'] * 250,
+    'amount': [n * 1.5 for n in range(1000)],
+}
+ORDER_COLUMNS = stage1_columns(('order_id', 'UInt64'), ('region', 'Nullable(String)'), ('amount', 'Float64'))
+
+
+def test_column_stats_are_collected_in_one_query(analyzer, fake_db):
+    fake_db.on('as total_count', answer_column_stats(ORDERS))
+
+    row_count, stats = analyzer._fetch_column_stats('orders_stage1', ORDER_COLUMNS)
+
+    assert row_count == 1000
+    assert fake_db.count_queries('as total_count') == 1
+    assert stats['region'] == {
+        'cardinality': 3, 'null_count': 250, 'total_count': 1000,
+        'sample_values': ['east', 'north', 'south'],
+    }
+    query, parameters = fake_db.queries[0]
+    assert parameters == {
+        'schema_name': 'silver', 'table_name': 'orders_stage1',
+        'col_0': 'order_id', 'col_1': 'region', 'col_2': 'amount',
+    }
+    assert 'uniq({col_1:Identifier}) as c_1' in query
+
+
+def test_failed_stats_chunk_is_retried_per_column(analyzer, fake_db):
+    fake_db.on('as total_count', answer_column_stats(ORDERS, failing={'region'}))
+
+    row_count, stats = analyzer._fetch_column_stats('orders_stage1', ORDER_COLUMNS)
+
+    assert row_count == 1000
+    assert set(stats) == {'order_id', 'amount'}
+    # The combined query, then one query per column
+    assert fake_db.count_queries('as total_count') == 4
+
+
+def test_row_count_falls_back_to_count_when_every_stats_query_fails(analyzer, fake_db):
+    fake_db.on('as total_count', lambda query, parameters: None)
+    fake_db.on('as row_count', [{'row_count': 1000}])
+
+    row_count, stats = analyzer._fetch_column_stats('orders_stage1', ORDER_COLUMNS)
+
+    assert (row_count, stats) == (1000, {})
+
+
+def test_near_unique_key_columns_get_an_exact_distinct_count(analyzer, fake_db):
+    # uniq() under-reports order_id by 0.5%; amount is near-unique too but can never be a key
+    fake_db.on('uniqExact', [{'e_0': 1000}])
+    fake_db.on('as total_count', answer_column_stats(ORDERS, approximate={'order_id': 995, 'amount': 996}))
+
+    metadata = analyzer.analyze_table_metadata('orders_stage1', columns=ORDER_COLUMNS)
+
+    exact_query, parameters = next((q, p) for q, p in fake_db.queries if 'uniqExact' in q)
+    assert 'uniqExact({col_0:Identifier}) as e_0' in exact_query
+    assert parameters['col_0'] == 'order_id' and 'col_1' not in parameters
+    order_id = next(col for col in metadata['columns'] if col['column_name'] == 'order_id')
+    assert order_id['cardinality'] == 1000
+    assert order_id['is_primary_key_candidate']
+
+
+def test_column_stats_are_reused_while_data_token_unchanged(analyzer, fake_db):
+    fake_db.on('as total_count', answer_column_stats(ORDERS))
+    token = (datetime(2024, 1, 1, 12, 0, 0), 1000, 1)
+
+    first = analyzer.analyze_table_metadata('orders_stage1', columns=ORDER_COLUMNS, freshness_token=token)
+    second = analyzer.analyze_table_metadata('orders_stage1', columns=ORDER_COLUMNS, freshness_token=token)
+    assert fake_db.count_queries('as total_count') == 1
+    assert first['columns'] == second['columns']
+
+    # New parts (e.g. an insert) move the token
+    analyzer.analyze_table_metadata('orders_stage1', columns=ORDER_COLUMNS,
+                                    freshness_token=(datetime(2024, 1, 1, 12, 5, 0), 1200, 2))
+    assert fake_db.count_queries('as total_count') == 2
+
+    # So does a changed column list under the same token
+    analyzer.analyze_table_metadata('orders_stage1', columns=ORDER_COLUMNS[:2],
+                                    freshness_token=(datetime(2024, 1, 1, 12, 5, 0), 1200, 2))
+    assert fake_db.count_queries('as total_count') == 3
+
+
+def test_column_stats_are_not_cached_without_token_or_when_incomplete(analyzer, fake_db):
+    fake_db.on('as total_count', answer_column_stats(ORDERS, failing={'region'}))
+    token = (datetime(2024, 1, 1, 12, 0, 0), 1000, 1)
+
+    analyzer.analyze_table_metadata('orders_stage1', columns=ORDER_COLUMNS)
+    analyzer.analyze_table_metadata('orders_stage1', columns=ORDER_COLUMNS, freshness_token=token)
+    analyzer.analyze_table_metadata('orders_stage1', columns=ORDER_COLUMNS, freshness_token=token)
+
+    assert ERDAnalyzer._stats_cache == {}
+    assert fake_db.count_queries('as total_count') == 12
+
+
+def test_schema_discovery_is_cached_per_schema_token(analyzer, fake_db, silver_schema):
+    analyzer._discover_schema('silver')
+    analyzer._discover_schema('silver')
+    assert fake_db.count_queries('FROM system.columns') == 1
+
+    # A created, dropped or altered table moves the system.tables token
+    silver_schema['token'] = (datetime(2024, 1, 1, 12, 5, 0), 3)
+    analyzer._discover_schema('silver')
+    assert fake_db.count_queries('FROM system.columns') == 2
+
+
+def test_overlap_query_uses_one_bitmap_per_column(analyzer, fake_db):
+    fake_db.on('bitmapAndCardinality', [{'n_0': 10, 'n_2': 8, 'n_3': 5, 'o_0_2': 8, 'o_0_3': 4}])
+    column_keys = [('orders_stage1', 'code'), ('orders_stage1', 'unused'),
+                   ('codes_stage1', 'code'), ('legacy_stage1', 'code')]
+
+    distinct_counts, overlap_counts = analyzer._fetch_overlap_counts([(0, 2), (0, 3)], column_keys)
+
+    assert distinct_counts == {0: 10, 2: 8, 3: 5}
+    assert overlap_counts == {(0, 2): 8, (0, 3): 4}
+    query, parameters = fake_db.queries[0]
+    assert parameters == {
+        'schema_name': 'silver',
+        't_0': 'orders_stage1', 'col_0': 'code',
+        't_2': 'codes_stage1', 'col_2': 'code',
+        't_3': 'legacy_stage1', 'col_3': 'code',
+    }
+    # Column 0 takes part in two pairs but is scanned once
+    assert query.count('groupBitmapState') == 3
+    assert 'bitmapAndCardinality(b_0, b_3) as o_0_3' in query
+
+
+def test_erd_metadata_is_stored_in_one_insert(analyzer, fake_db):
+    erd_metadata = {
+        'schema_name': 'silver',
+        'analysis_timestamp': '2024-01-01 12:00:00',
+        'tables': {
+            'orders_stage1': {
+                'table_type': 'fact', 'row_count': 1000, 'column_count': 2,
+                'columns': [
+                    analyzed_column('order_id', 'UInt64', 1000, 1000, classification='fact', is_pk=True),
+                    analyzed_column('code', 'String', 100, 1000),
+                ],
+            },
+            'codes_stage1': {
+                'table_type': 'dimension', 'row_count': 100, 'column_count': 1,
+                'columns': [analyzed_column('code', 'String', 100, 100)],
+            },
+        },
+        'relationships': [
+            {'table1': 'orders_stage1', 'column1': 'code', 'table2': 'codes_stage1', 'column2': 'code'},
+        ],
+    }
+
+    assert analyzer.store_erd_metadata(erd_metadata)
+
+    (table, rows, column_names), = fake_db.inserts
+    assert table == 'metadata.erd'
+    assert column_names == list(erd_module._ERD_INSERT_COLUMNS)
+    orders = dict(zip(column_names, rows[0]))
+    assert orders['table_name'] == 'orders_stage1'
+    assert orders['analysis_timestamp'] == datetime(2024, 1, 1, 12, 0, 0)
+    assert orders['primary_key_candidates'] == ['order_id']
+    assert orders['fact_columns'] == ['order_id']
+    assert orders['dimension_columns'] == ['code']
+    assert orders['relationships'] == ['orders_stage1.code = codes_stage1.code']
+    assert dict(zip(column_names, rows[1]))['relationships'] == orders['relationships']
+
+
+def test_generate_erd_metadata_keeps_discovery_order(analyzer, fake_db, silver_schema):
+    fake_db.on('FROM system.parts', [])
+    fake_db.on('as total_count', answer_column_stats({'code': [f'c{n}' for n in range(100)]}))
+    fake_db.on('bitmapAndCardinality', answer_overlaps({
+        ('orders_stage1', 'code'): {f'c{n}' for n in range(100)},
+        ('codes_stage1', 'code'): {f'c{n}' for n in range(100)},
+    }))
+    analyzer.erd_parallelism = 1
+
+    erd_metadata = analyzer.generate_erd_metadata()
+
+    assert list(erd_metadata['tables']) == ['orders_stage1', 'codes_stage1']
+    assert erd_metadata['total_relationships'] == 1
@@ -0,0 +1,57 @@
+"""
+Unit tests for TransformationStorage bulk inserts.
+
+ClickHouse is replaced by the FakeDatabaseManager from conftest.py.
+"""
+
+import json
+
+from kimball.core.sql_transformation import SQLTransformation, SQLTransformationData, TransformationStage
+from kimball.core.transformation_storage import TransformationStorage
+
+
+def transformation(stage, transformation_id, execution_sequence, statement_type='INSERT', **metadata):
+    """Build a transformation statement for the given stage."""
+    return SQLTransformation(SQLTransformationData(
+        raw_sql=f'-- {transformation_id}.{execution_sequence}',
+        stage=stage,
+        transformation_id=transformation_id,
+        transformation_name=f'transformation_{transformation_id}',
+        source_tables=[],
+        target_tables=[],
+        statement_type=statement_type,
+        execution_sequence=execution_sequence,
+        metadata=metadata,
+        validation={}
+    ))
+
+
+def test_bulk_store_inserts_each_table_once_in_sort_key_order(fake_db):
+    storage = TransformationStorage(fake_db)
+    transformations = [
+        transformation(TransformationStage.STAGE3, 2, 2),
+        transformation(TransformationStage.STAGE1, 7, 1),
+        transformation(TransformationStage.STAGE3, 2, 1, statement_type='CREATE'),
+        transformation(TransformationStage.STAGE3, 1, 1, dependencies=('a', 'b'), execution_frequency='hourly'),
+    ]
+
+    assert storage.store_transformations_bulk(transformations)
+
+    inserts = {table: (rows, column_names) for table, rows, column_names in fake_db.inserts}
+    assert list(inserts) == ['metadata.transformation3', 'metadata.transformation1']
+    rows, column_names = inserts['metadata.transformation3']
+    assert column_names == list(TransformationStorage.BULK_INSERT_COLUMNS)
+    # Sorted by the tables' ORDER BY (transformation_id, execution_sequence)
+    assert [(row[1], row[6]) for row in rows] == [(1, 1), (2, 1), (2, 2)]
+    assert rows[0] == [
+        'stage3', 1, 'transformation_1', 'metadata', ['a', 'b'], 'hourly', 1, 'INSERT',
+        json.dumps(transformations[3].to_json()), 1
+    ]
+    assert rows[1][7] == 'CREATE'
+
+
+def test_bulk_store_reports_a_failed_insert(fake_db, monkeypatch):
+    monkeypatch.setattr(fake_db, 'insert_rows', lambda *args, **kwargs: False)
+    storage = TransformationStorage(fake_db)
+
+    assert not storage.store_transformations_bulk([transformation(TransformationStage.STAGE1, 1, 1)])